@@ -0,0 +1,150 @@
+import queue
+import threading
+
+import numpy as np
+
+from features import pad
+
+# Samples loaded from the library and augmented together
+BATCH = 64
+
+# Augmented copies made of every sample
+COPIES = 4
+
+# Largest rotation (radians) and range of scale of the new endpoint
+MAX_ROTATION = 0.35
+SCALE_RANGE = (0.7, 1.3)
+
+# Largest time-warp strength; |strength| < 1 keeps time increasing
+MAX_WARP = 0.5
+
+# Standard deviation of the positional jitter, in frame units
+JITTER = 0.8
+
+
+def augment(columns_list, rng):
+    # One augmented copy of each (x, y, t) trajectory, all transformed together on
+    # padded arrays: mirrored across the A->B line (half of them), rotated and
+    # scaled about the first point towards a new endpoint, time-warped and
+    # jittered. Returns a list of (x, y, t) arrays.
+    x, y, t, lengths = pad(columns_list)
+    batch = len(lengths)
+    if batch == 0:
+        return []
+    x0, y0, t0 = x[:, :1], y[:, :1], t[:, :1]
+    dx, dy = x - x0, y - y0
+
+    # Mirror: flip the side the path bows to
+    sign = np.where(rng.random(batch) < 0.5, -1.0, 1.0)[:, None]
+    dy = dy * sign
+
+    # Rotate and scale towards a new endpoint
+    angle = rng.uniform(-MAX_ROTATION, MAX_ROTATION, batch)[:, None]
+    scale = rng.uniform(*SCALE_RANGE, batch)[:, None]
+    cos, sin = np.cos(angle) * scale, np.sin(angle) * scale
+    dx, dy = cos * dx - sin * dy, sin * dx + cos * dy
+
+    # Time warp: u -> u + a * sin(pi * u) / pi over the normalised duration
+    last = lengths - 1
+    rows = np.arange(batch)
+    duration = (t[rows, last] - t0[:, 0])[:, None]
+    u = np.divide(t - t0, duration, out=np.zeros_like(t), where=duration > 0)
+    strength = rng.uniform(-MAX_WARP, MAX_WARP, batch)[:, None]
+    warped = t0 + duration * (u + strength * np.sin(np.pi * u) / np.pi)
+
+    # Jitter every point but the endpoints
+    noise = rng.normal(0.0, JITTER, (2,) + x.shape)
+    interior = (np.arange(x.shape[1])[None, :] > 0) & (np.arange(x.shape[1])[None, :] < last[:, None])
+    noise *= interior
+    x = x0 + dx + noise[0]
+    y = y0 + dy + noise[1]
+
+    return [(x[i, :n], y[i, :n], warped[i, :n]) for i, n in enumerate(lengths)]
+
+
+def augmented_batches(store, ids, copies=COPIES, batch=BATCH, seed=None):
+    # Lazily yield augmented batches (lists of (x, y, t) arrays) made from the
+    # samples `ids` of the library. Only one batch of samples is held at a time,
+    # and the same seed gives the same batches. The batch is copied out of the
+    # store, so no view of its mapping stays alive between yields.
+    rng = np.random.default_rng(seed)
+    ids = list(ids)
+    order = rng.permutation(len(ids))
+    for start in range(0, len(ids), batch):
+        chunk = [tuple(np.array(column, dtype=np.float64) for column in store.columns(ids[i]))
+                 for i in order[start:start + batch]]
+        for _ in range(copies):
+            yield augment(chunk, rng)
+
+
+END = object()
+
+
+class Prefetcher:
+    # Runs an iterator on a worker thread, keeping up to `depth` items ready.
+    # Iterate it to block for each item, or call ready() from a UI timer to take
+    # whatever is finished without waiting. Errors are raised in the consumer.
+
+    def __init__(self, iterable, depth=4):
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = False
+        self.finished = False
+        self.thread = threading.Thread(target=self.fill, args=(iterable,), name="prefetch", daemon=True)
+        self.thread.start()
+
+    def fill(self, iterable):
+        try:
+            for item in iterable:
+                if not self.put(item):
+                    return
+        except Exception as error:
+            self.put(error)
+        self.put(END)
+
+    def put(self, item):
+        # Wait for room in the queue unless the consumer has gone away
+        while not self.stopped:
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def take(self, item):
+        if item is END:
+            self.finished = True
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        return item
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.finished:
+            raise StopIteration
+        return self.take(self.queue.get())
+
+    def ready(self):
+        # The items that are already available, without blocking
+        items = []
+        while not self.finished:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                items.append(self.take(item))
+            except StopIteration:
+                break
+        return items
+
+    def close(self):
+        # Stop the worker thread and wait for it, so whatever the iterator reads
+        # from can be closed afterwards; it finishes the item it is making first
+        self.stopped = True
+        self.finished = True
+        self.thread.join()
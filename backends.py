@@ -0,0 +1,65 @@
+import importlib
+import threading
+
+# How often the Tk thread checks for modules the loader thread has finished
+POLL_MS = 50
+
+
+class BackendLoader:
+    # Imports the heavy modules (NumPy, training, synthesis, ...) on a background
+    # thread after the window is up, and hands them to callbacks on the Tk thread.
+    # on_error(errors) is called with {module name: exception} if any import fails.
+
+    def __init__(self, widget, on_error=None):
+        self.widget = widget
+        self.on_error = on_error
+        self.groups = []
+        self.modules = {}
+        self.errors = {}
+        self.notified = set()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def load(self, names, on_ready):
+        # on_ready(*modules) is called on the Tk thread once all of `names` are imported
+        self.groups.append((tuple(names), on_ready))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="backend-loader", daemon=True)
+        self.thread.start()
+        self.widget.after(POLL_MS, self.poll)
+
+    def run(self):
+        for names, _ in self.groups:
+            for name in names:
+                self.import_module(name)
+
+    def import_module(self, name):
+        try:
+            module = importlib.import_module(name)
+        except Exception as error:
+            with self.lock:
+                self.errors[name] = error
+            return None
+        with self.lock:
+            self.modules[name] = module
+        return module
+
+    def poll(self):
+        for index, (names, on_ready) in enumerate(self.groups):
+            if index not in self.notified and self.ready(names):
+                self.notified.add(index)
+                on_ready(*(self.modules[name] for name in names))
+        if self.failed():
+            if self.on_error is not None:
+                self.on_error(dict(self.errors))
+        elif len(self.notified) < len(self.groups):
+            self.widget.after(POLL_MS, self.poll)
+
+    def ready(self, names):
+        with self.lock:
+            return all(name in self.modules for name in names)
+
+    def failed(self):
+        # True once the loader thread is done and some group can never be ready
+        return not self.thread.is_alive() and bool(self.errors)
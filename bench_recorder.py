@@ -0,0 +1,198 @@
+import argparse
+import math
+import os
+import tempfile
+import timeit
+import tracemalloc
+
+from recorder import Recorder, recorded_text
+from sample_store import SampleStore
+from sampler import PointerSampler
+from session_log import TAIL_POINTS, SessionLog
+from simplify import StreamingSimplifier
+from trajectory import Trajectory
+
+# Event counts replayed by default
+SIZES = (1000, 100000, 1000000)
+
+# Simulated time between two pointer events, in ns (a 1 kHz mouse)
+EVENT_INTERVAL_NS = 1000000
+
+# Samples the simulated UI drains from the sampler per frame
+SAMPLES_PER_FRAME = 16
+
+
+def synthetic_events(count, width=1200, height=600):
+    # A wavy left-to-right sweep across the canvas, repeated as often as needed
+    for i in range(count):
+        phase = (i % 2000) / 2000
+        yield width * phase, height / 2 + height / 4 * math.sin(phase * 6 * math.pi)
+
+
+class FakeClock:
+    # Deterministic clock so recorded timestamps do not depend on benchmark speed
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def bench_events(events, simplifier=None, log=None):
+    clock = FakeClock()
+    recorder = Recorder(clock=clock, simplifier=simplifier)
+    if log is not None:
+        # Long session: everything beyond the tail is spilled to the log
+        recorder.tail = TAIL_POINTS
+        recorder.log = log
+    recorder.start()
+    record_events(recorder, clock, events)
+    recorder.stop()
+    return recorder.coordinates
+
+
+def bench_sampler(events):
+    sampler = PointerSampler()
+    trajectory = Trajectory()
+    buffer = sampler.buffer
+    for i, (x, y) in enumerate(events):
+        buffer.push(x, y, i * EVENT_INTERVAL_NS)
+        if i % SAMPLES_PER_FRAME == SAMPLES_PER_FRAME - 1:
+            sampler.drain_into(trajectory, 0)
+    sampler.drain_into(trajectory, 0)
+    return trajectory
+
+
+def bench_text(trajectory):
+    return recorded_text(trajectory)
+
+
+def bench_store(trajectory, path):
+    # Write the trajectory as the only sample of a fresh library and read it back
+    if os.path.exists(path):
+        os.remove(path)
+    store = SampleStore(path)
+    try:
+        store.load(store.append(trajectory))
+    finally:
+        store.close()
+    return os.path.getsize(path)
+
+
+def measure(function, repeat):
+    # Best wall time over `repeat` runs, and the result of the last run
+    result = None
+    best = math.inf
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        result = function()
+        best = min(best, timeit.default_timer() - start)
+    return best, result
+
+
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(sizes, repeat, trace_memory):
+    print(f"{'events':>9} {'stage':<10} {'total ms':>10} {'ns/event':>10} {'bytes/event':>12} {'peak MiB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.ksb")
+        log = SessionLog(os.path.join(directory, "bench.ksl"))
+        for size in sizes:
+            events = list(synthetic_events(size))
+            trajectory = bench_events(events)
+
+            # Each stage reports the bytes it produced: trajectory memory, text
+            # length or library file size
+            stages = (
+                ("events", lambda: bench_events(events).memory_usage()),
+                ("simplify", lambda: bench_events(events, StreamingSimplifier()).memory_usage()),
+                ("long", lambda: bench_events(events, log=log).memory_usage()),
+                ("sampler", lambda: bench_sampler(events).memory_usage()),
+                ("text", lambda: len(bench_text(trajectory))),
+                ("store", lambda: bench_store(trajectory, path)),
+            )
+            for name, function in stages:
+                seconds, produced = measure(function, repeat)
+                peak = f"{peak_memory(function) / 2 ** 20:9.1f}" if trace_memory else f"{'-':>9}"
+                print(f"{size:>9} {name:<10} {seconds * 1000:>10.1f} {seconds / size * 1e9:>10.0f} {produced / size:>12.1f} {peak}")
+        log.close()
+
+
+def record_events(recorder, clock, events):
+    for x, y in events:
+        clock.now += EVENT_INTERVAL_NS
+        recorder.pointer_moved(x, y)
+
+
+def check_remove_last_simplified():
+    # Remove Last during a simplified pass: the samples after it must still reach
+    # the (new) coordinates
+    clock = FakeClock()
+    recorder = Recorder(clock=clock, simplifier=StreamingSimplifier())
+    recorder.start()
+    record_events(recorder, clock, synthetic_events(100))
+    recorder.remove_last()
+    record_events(recorder, clock, synthetic_events(10))
+    recorder.stop()
+    if len(recorder.coordinates) < 2:
+        return f"{len(recorder.coordinates)} points recorded after remove_last with the simplifier"
+    return None
+
+
+def check_remove_last_spilled():
+    # Remove Last during a long session that already spilled: the session must
+    # hold only what was recorded after it
+    clock = FakeClock()
+    recorder = Recorder(clock=clock)
+    with tempfile.TemporaryDirectory() as directory:
+        log = SessionLog(os.path.join(directory, "check.ksl"), chunk=100)
+        recorder.tail = 300
+        recorder.log = log
+        recorder.start()
+        record_events(recorder, clock, synthetic_events(1000))
+        recorder.remove_last()
+        events = list(synthetic_events(1000))[::-1]
+        record_events(recorder, clock, events)
+        recorder.stop()
+        session = recorder.session()
+        problem = None
+        if session is None or len(session) != len(events) or session[0]["x"] != events[0][0]:
+            problem = f"session after remove_last holds {session and len(session)} points, expected {len(events)}"
+        log.close()
+    return problem
+
+
+# Regression checks of the recorder core; each returns a problem or None
+CHECKS = (check_remove_last_simplified, check_remove_last_spilled)
+
+
+def run_checks():
+    failed = 0
+    for check in CHECKS:
+        problem = check()
+        print(f"{check.__name__}: {problem or 'ok'}")
+        failed += problem is not None
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic pointer event streams through the headless recorder core.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="event counts to replay")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the best is reported")
+    parser.add_argument("--trace-memory", action="store_true", help="also report peak traced allocations (slow)")
+    parser.add_argument("--check", action="store_true", help="run the regression checks instead of the benchmark")
+    args = parser.parse_args()
+    if args.check:
+        raise SystemExit(1 if run_checks() else 0)
+    run(args.sizes, args.repeat, args.trace_memory)
+
+
+if __name__ == "__main__":
+    main()
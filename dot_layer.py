@@ -0,0 +1,180 @@
+import math
+import tkinter as tk
+from bisect import bisect_right
+
+from recorded_text import FRAME_MS
+from trajectory import Trajectory
+
+# Most points drawn by one canvas item besides the one it shares with the
+# previous item; per-frame pieces are merged up to this
+SEGMENT_POINTS = 256
+
+
+class DotLayer:
+    # Draws a Trajectory on the canvas. Points that arrive within one frame are
+    # drawn together as a single polyline joined to the previous frame's last point.
+    # Neighbouring pieces of the same size are merged like the digits of a binary
+    # counter, up to SEGMENT_POINTS points, so there are a few items per segment
+    # and each one only covers (and damages) a short stretch of the path.
+
+    def __init__(self, canvas, tag="dot", fill="black", width=2):
+        self.canvas = canvas
+        self.tag = tag
+        self.fill = fill
+        self.width = width
+
+        # EndpointFrame the trajectory is in, mapped to the canvas when drawing;
+        # None draws its coordinates as canvas pixels
+        self.frame = None
+
+        self.trajectory = Trajectory()
+
+        # Canvas items with the range of points each one draws and how many times
+        # it was merged (None once it is closed); consecutive ranges share their boundary point so the
+        # pieces join up
+        self.items = []
+        self.ranges = []
+        self.levels = []
+
+        # Number of points of the trajectory already on the canvas, and its
+        # offset when they were drawn
+        self.drawn = 0
+        self.offset = 0
+
+        # Items whose points were moved and need their coordinates refreshed
+        self.dirty = set()
+
+        self.flush_pending = None
+
+    def update(self, trajectory):
+        if trajectory is not self.trajectory:
+            # A new recording: leave the previous one's items where they are
+            self.trajectory = trajectory
+            self.items = []
+            self.ranges = []
+            self.levels = []
+            self.dirty = set()
+            self.drawn = 0
+            self.offset = trajectory.offset
+        self.schedule()
+
+    def schedule(self):
+        if self.flush_pending is None:
+            self.flush_pending = self.canvas.after(FRAME_MS, self.flush)
+
+    def flush(self):
+        self.flush_pending = None
+        if self.trajectory.offset != self.offset:
+            # Points were dropped from the front (a long session spilled them):
+            # draw what is left afresh, so the canvas only holds the tail
+            self.delete_items()
+            self.offset = self.trajectory.offset
+        for k in self.dirty:
+            if k < len(self.items):
+                self.canvas.coords(self.items[k], self.coords(*self.ranges[k]))
+        self.dirty = set()
+
+        count = len(self.trajectory)
+        if count < self.drawn:
+            self.delete_items()
+        if count == self.drawn:
+            return
+
+        # Start at the last drawn point so consecutive frames join up
+        self.add_segments(max(0, self.drawn - 1), count)
+        self.drawn = count
+        self.merge()
+
+    def coords(self, start, stop):
+        xs, ys, _ = self.trajectory.columns(start, stop)
+        if self.frame is not None:
+            coords = self.frame.canvas_coords(xs, ys)
+        else:
+            coords = [value for point in zip(xs, ys) for value in point]
+        if len(xs) == 1:
+            x, y = coords
+            return [x - 1, y - 1, x + 1, y + 1]
+        return coords
+
+    def add_item(self, start, stop, level=0):
+        coords = self.coords(start, stop)
+        if stop - start == 1:
+            item = self.canvas.create_rectangle(coords, fill=self.fill, outline=self.fill, tags=self.tag)
+        else:
+            item = self.canvas.create_line(coords, fill=self.fill, width=self.width, capstyle=tk.ROUND, joinstyle=tk.ROUND, tags=self.tag)
+        self.items.append(item)
+        self.ranges.append((start, stop))
+        self.levels.append(level)
+
+    def add_segments(self, start, stop):
+        # Draw points start..stop in closed items of SEGMENT_POINTS (e.g. after a
+        # redraw); only the last one can be merged with the following frames
+        while stop - start - 1 > SEGMENT_POINTS:
+            self.add_item(start, start + SEGMENT_POINTS + 1, None)
+            start += SEGMENT_POINTS
+        self.add_item(start, stop)
+
+    def move_point(self, index):
+        # A point was moved in the trajectory: refresh only the items drawing it
+        # with the next frame
+        k = bisect_right(self.ranges, (index, math.inf)) - 1
+        for j in (k, k - 1):
+            if 0 <= j < len(self.ranges) and self.ranges[j][0] <= index < self.ranges[j][1]:
+                self.dirty.add(j)
+        self.schedule()
+
+    def merge(self):
+        # Join the last two pieces while they were merged equally often, so each
+        # point is redrawn about log2(SEGMENT_POINTS) times in all. A piece that
+        # cannot grow within SEGMENT_POINTS is closed and never merged again.
+        while len(self.items) >= 2 and self.levels[-1] == self.levels[-2]:
+            start, stop = self.ranges[-2][0], self.ranges[-1][1]
+            if stop - start - 1 > SEGMENT_POINTS:
+                self.levels[-2] = None
+                break
+            level = self.levels[-1] + 1
+            for _ in range(2):
+                self.canvas.delete(self.items.pop())
+                self.ranges.pop()
+                self.levels.pop()
+            self.add_item(start, stop, level)
+
+    def delete_items(self):
+        for item in self.items:
+            self.canvas.delete(item)
+        self.items = []
+        self.ranges = []
+        self.levels = []
+        self.dirty = set()
+        self.drawn = 0
+
+    def redraw(self, trajectory):
+        # Drop everything with our tag and draw the trajectory in closed segments
+        # of SEGMENT_POINTS, so moving a point later refreshes at most two items
+        self.cancel()
+        self.canvas.delete(self.tag)
+        self.trajectory = trajectory
+        self.items = []
+        self.ranges = []
+        self.levels = []
+        self.dirty = set()
+        self.drawn = len(trajectory)
+        self.offset = trajectory.offset
+        if self.drawn:
+            self.add_segments(0, self.drawn)
+
+    def clear(self):
+        self.cancel()
+        self.canvas.delete(self.tag)
+        self.trajectory = Trajectory()
+        self.items = []
+        self.ranges = []
+        self.levels = []
+        self.dirty = set()
+        self.drawn = 0
+        self.offset = 0
+
+    def cancel(self):
+        if self.flush_pending is not None:
+            self.canvas.after_cancel(self.flush_pending)
+            self.flush_pending = None
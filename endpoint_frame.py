@@ -0,0 +1,55 @@
+import math
+
+# Samples are stored with A at (0, 0) and B at (FRAME_LENGTH, 0), whatever the
+# window size or the button positions were when they were captured
+FRAME_LENGTH = 1000.0
+
+
+class EndpointFrame:
+    # Affine map between canvas pixels and the A->B frame of a pass: origin at A,
+    # x axis towards B, B at (length, 0), y axis 90 degrees clockwise from it like
+    # on the canvas. Built once per layout change; to_local() is applied to each
+    # incoming sample and canvas_coords() to whole columns at once when drawing.
+
+    def __init__(self, a, b, length=FRAME_LENGTH):
+        self.a = a
+        self.b = b
+        self.length = length
+        (ax, ay), (bx, by) = a, b
+        distance = math.hypot(bx - ax, by - ay)
+        if distance > 0:
+            ux, uy = (bx - ax) / distance, (by - ay) / distance
+        else:
+            ux, uy, distance = 1.0, 0.0, length
+
+        # Frame units per canvas pixel, and the A->B direction on the canvas
+        self.scale = length / distance
+        self.unit = (ux, uy)
+
+        # canvas = origin + matrix @ local
+        self.origin = (ax, ay)
+        self.matrix = ((ux / self.scale, -uy / self.scale),
+                       (uy / self.scale, ux / self.scale))
+
+    def to_local(self, x, y):
+        (ax, ay), (ux, uy), s = self.origin, self.unit, self.scale
+        dx, dy = x - ax, y - ay
+        return (s * (ux * dx + uy * dy), s * (ux * dy - uy * dx))
+
+    def to_canvas(self, x, y):
+        (ax, ay), ((m00, m01), (m10, m11)) = self.origin, self.matrix
+        return (ax + m00 * x + m01 * y, ay + m10 * x + m11 * y)
+
+    def canvas_coords(self, xs, ys):
+        # Flat [x0, y0, x1, y1, ...] canvas coordinates of frame columns, as the
+        # canvas create/coords calls take them. NumPy is imported here so that the
+        # window can come up before it is loaded.
+        import numpy as np
+
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        (ax, ay), ((m00, m01), (m10, m11)) = self.origin, self.matrix
+        out = np.empty(2 * len(xs))
+        out[0::2] = ax + m00 * xs + m01 * ys
+        out[1::2] = ay + m10 * xs + m11 * ys
+        return out.tolist()
@@ -0,0 +1,243 @@
+import argparse
+import gzip
+import hashlib
+import json
+import math
+import os
+import tempfile
+import time
+import tkinter as tk
+
+# Event types that are logged and replayed
+EVENT_TYPES = ("Motion", "ButtonPress", "ButtonRelease", "Enter", "Leave", "Configure")
+
+# Events handed to Tk per timer tick when replaying as fast as possible
+FAST_BATCH = 500
+
+
+def open_log(path, mode):
+    # Event logs are NDJSON, gzip-compressed if the name ends in .gz
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8", buffering=1 << 20)
+
+
+def widget_names(app):
+    # Tk path name -> attribute name of the app's widgets, so logs do not depend
+    # on the generated Tk names
+    return {str(value): name for name, value in vars(app).items() if isinstance(value, tk.Misc)}
+
+
+class EventLog:
+    # Logs the raw Tk events that reach the app's widgets, with perf_counter_ns
+    # timestamps, one JSON object per line:
+    #   {"t": ns, "type": "Motion", "widget": "canvas", "x": 10, "y": 20}
+    # Configure events carry width and height, button events the button number.
+
+    def __init__(self, app, path):
+        self.app = app
+        self.names = widget_names(app)
+        self.file = open_log(path, "w")
+        self.count = 0
+        for event_type in EVENT_TYPES:
+            app.master.bind_all(f"<{event_type}>", self.log, add="+")
+
+    def log(self, event):
+        name = self.names.get(str(event.widget))
+        if name is None:
+            return
+        event_type = str(event.type)
+        entry = {"t": time.perf_counter_ns(), "type": event_type, "widget": name}
+        if event_type == "Configure":
+            entry["width"], entry["height"] = event.width, event.height
+        else:
+            entry["x"], entry["y"] = event.x, event.y
+            if event_type in ("ButtonPress", "ButtonRelease"):
+                entry["button"] = event.num
+        self.file.write(json.dumps(entry) + "\n")
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+def read_events(path):
+    with open_log(path, "r") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def synthetic_session(passes, moves, width=1400, height=600, interval_ms=4):
+    # Events of `passes` A->B recordings with `moves` motion events each, on a
+    # canvas of the given size with A and B at their default places
+    t = 0
+    step = interval_ms * 1000000
+
+    def event(event_type, widget, **fields):
+        nonlocal t
+        t += step
+        return dict(t=t, type=event_type, widget=widget, **fields)
+
+    yield event("Configure", "canvas", width=width, height=height)
+    ax, bx, y = 0.05 * width, 0.95 * width, 0.5 * height
+    for i in range(passes):
+        for button in ("a_button", "b_button"):
+            if button == "b_button":
+                for k in range(1, moves + 1):
+                    phase = k / (moves + 1)
+                    x = ax + (bx - ax) * phase
+                    yield event("Motion", "canvas", x=round(x), y=round(y + 0.2 * height * math.sin(math.pi * phase + i)))
+            yield event("Enter", button, x=5, y=5)
+            yield event("ButtonPress", button, x=5, y=5, button=1)
+            yield event("ButtonRelease", button, x=5, y=5, button=1)
+            yield event("Leave", button, x=5, y=5)
+
+
+class EventReplayer:
+    # Feeds logged events back into a DrawingApp with event_generate, so they go
+    # through the same bindings as real input. The recorder's clock follows the
+    # logged timestamps, which makes the recorded coordinates and times identical
+    # at any replay speed. speed=None replays as fast as possible.
+
+    def __init__(self, app, events, speed=1.0, on_finish=None):
+        self.app = app
+        self.events = iter(events)
+        self.speed = speed
+        self.on_finish = on_finish
+        self.widgets = {}
+        self.now = 0
+        self.first = None
+        self.started = 0
+        self.replayed = 0
+        self.next_event = None
+        self.finished = False
+
+        # The pointer poll and sampler thread read the real pointer and wall clock
+        app.poll_pointer = False
+        app.recorder.clock = lambda: self.now
+
+    def start(self):
+        self.started = time.perf_counter_ns()
+        self.next_event = next(self.events, None)
+        self.app.master.after(0, self.tick)
+
+    def tick(self):
+        if self.speed is None:
+            for _ in range(FAST_BATCH):
+                if self.next_event is None:
+                    break
+                self.replay(self.next_event)
+                self.next_event = next(self.events, None)
+        else:
+            # Everything that is due by now on the scaled replay clock
+            elapsed = (time.perf_counter_ns() - self.started) * self.speed
+            while self.next_event is not None and self.next_event["t"] - self.first_time() <= elapsed:
+                self.replay(self.next_event)
+                self.next_event = next(self.events, None)
+
+        if self.next_event is None:
+            self.finished = True
+            if self.on_finish is not None:
+                self.on_finish()
+            return
+        if self.speed is None:
+            self.app.master.after(1, self.tick)
+        else:
+            wait = (self.next_event["t"] - self.first_time()) / self.speed - (time.perf_counter_ns() - self.started)
+            self.app.master.after(max(1, int(wait / 1000000)), self.tick)
+
+    def first_time(self):
+        if self.first is None:
+            self.first = self.next_event["t"]
+        return self.first
+
+    def widget(self, name):
+        widget = self.widgets.get(name)
+        if widget is None:
+            widget = self.widgets[name] = getattr(self.app, name)
+        return widget
+
+    def replay(self, entry):
+        self.now = entry["t"]
+        widget = self.widget(entry["widget"])
+        event_type = entry["type"]
+        if event_type == "Configure":
+            widget.event_generate("<Configure>", width=entry["width"], height=entry["height"])
+        elif event_type in ("ButtonPress", "ButtonRelease"):
+            widget.event_generate(f"<{event_type}-{entry['button']}>", x=entry["x"], y=entry["y"])
+        else:
+            widget.event_generate(f"<{event_type}>", x=entry["x"], y=entry["y"])
+        self.replayed += 1
+
+
+def sample_digests(store):
+    # Point count, duration and a checksum of the stored columns of every sample
+    digests = []
+    for sample_id in store.ids():
+        xs, ys, ts = store.columns(sample_id)
+        digest = hashlib.sha1()
+        for column in (xs, ys, ts):
+            digest.update(column.tobytes())
+        digests.append({"id": sample_id, "points": len(xs), "duration_ms": float(ts[-1]) if len(ts) else 0.0,
+                        "sha1": digest.hexdigest()})
+    return digests
+
+
+def replay(log, speed=None):
+    # Replay an event log into a fresh app with an empty sample library. Returns
+    # the digests of the recorded samples, the number of events and the seconds taken.
+    from new import DrawingApp
+
+    with tempfile.TemporaryDirectory() as directory:
+        root = tk.Tk()
+        root.geometry("1400x600")
+        app = DrawingApp(root, samples_path=os.path.join(directory, "replay.ksb"))
+        root.update()
+        replayer = EventReplayer(app, read_events(log) if isinstance(log, str) else log, speed, root.quit)
+        replayer.start()
+        root.mainloop()
+        seconds = (time.perf_counter_ns() - replayer.started) / 1e9
+        app.writer.flush()
+        digests = sample_digests(app.samples)
+        app.close()
+        root.destroy()
+    return digests, replayer.replayed, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a logged Tk event stream into the app and check what it records.")
+    parser.add_argument("log", nargs="?", help="event log written with new.py --log-events (NDJSON, optionally .gz)")
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("PASSES", "MOVES"), help="replay a generated session instead of a log")
+    parser.add_argument("--speed", type=float, default=0, help="replay speed relative to the log; 0 replays as fast as possible")
+    parser.add_argument("--expect", metavar="PATH", help="compare the recorded samples with a previous --save")
+    parser.add_argument("--save", metavar="PATH", help="write the recorded samples' digests as JSON")
+    args = parser.parse_args()
+    if args.synthetic:
+        log = synthetic_session(*args.synthetic)
+    elif args.log:
+        log = args.log
+    else:
+        parser.error("give an event log or --synthetic PASSES MOVES")
+
+    digests, events, seconds = replay(log, args.speed or None)
+    print(f"replayed {events} events in {seconds:.2f} s ({events / max(seconds, 1e-9):.0f} events/s), {len(digests)} samples")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(digests, f, indent=1)
+    if args.expect:
+        with open(args.expect) as f:
+            expected = json.load(f)
+        if digests != expected:
+            for got, want in zip(digests, expected):
+                if got != want:
+                    print(f"sample {want['id']} differs: expected {want}, got {got}")
+            if len(digests) != len(expected):
+                print(f"expected {len(expected)} samples, got {len(digests)}")
+            raise SystemExit(1)
+        print("recorded samples match")
+
+
+if __name__ == "__main__":
+    main()
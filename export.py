@@ -0,0 +1,135 @@
+import gzip
+import json
+import os
+import struct
+
+from trajectory import Trajectory
+
+# Size of the write buffer in front of the file (or compressor)
+BUFFER_SIZE = 1 << 20
+
+# Points formatted per write; bounds the size of any string built at once
+CHUNK_POINTS = 4096
+
+FLOAT32 = struct.Struct('<f')
+
+FORMATS = ("json", "ndjson")
+COMPRESSIONS = (None, "gzip", "zstd")
+
+
+class ExportError(Exception):
+    pass
+
+
+def number(value):
+    # Shortest text that reads back as the same float32, as stored in the library;
+    # whole numbers are written without ".0" like in the recorded text
+    value = float(value)
+    if value.is_integer():
+        return str(int(value))
+    for digits in (6, 7, 8):
+        text = f"{value:.{digits}g}"
+        if FLOAT32.unpack(FLOAT32.pack(float(text)))[0] == value:
+            return text
+    return repr(value)
+
+
+def point(x, y, t):
+    return f'{{"x": {number(x)}, "y": {number(y)}, "t": {number(t)}}}'
+
+
+def guess_format(path):
+    # Format and compression from the file name, e.g. "samples.ndjson.gz"
+    name = os.path.basename(path).lower()
+    compression = None
+    if name.endswith(".gz"):
+        compression, name = "gzip", name[:-3]
+    elif name.endswith(".zst"):
+        compression, name = "zstd", name[:-4]
+    return ("ndjson" if name.endswith((".ndjson", ".jsonl")) else "json"), compression
+
+
+def open_stream(path, compression=None):
+    # Binary file object for `path`, compressing on the fly if asked to
+    if compression not in COMPRESSIONS:
+        raise ExportError(f"unknown compression {compression!r}")
+    raw = open(path, "wb", buffering=BUFFER_SIZE)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6), raw
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ExportError("zstd export needs the zstandard package") from None
+        return zstandard.ZstdCompressor().stream_writer(raw, closefd=False), raw
+    return raw, None
+
+
+def write_sample(out, sample_id, sample):
+    # One sample as a JSON object in the "A" / "B" / "points" layout, written in
+    # chunks so that no string grows with the length of the recording. The sample
+    # is a Trajectory or anything else read through chunks(), such as a long
+    # session streamed back from disk.
+    count = len(sample)
+    first, last = sample[0], sample[-1]
+    out.write(f'{{"id": {json.dumps(sample_id)}, "A": {point(first["x"], first["y"], 0)}, '
+              f'"B": {point(last["x"], last["y"], last["t"])}, "points": ['.encode())
+    index = 0
+    separator = ""
+    for xs, ys, ts in sample.chunks(CHUNK_POINTS):
+        # Interior points only: A and B are written above
+        start, stop = max(0, 1 - index), min(len(xs), count - 1 - index)
+        if start < stop:
+            text = ", ".join(point(x, y, t) for x, y, t in zip(xs[start:stop], ys[start:stop], ts[start:stop]))
+            out.write((separator + text).encode())
+            separator = ", "
+        index += len(xs)
+    out.write(b']}')
+
+
+def write_samples(out, samples, format="json"):
+    # Write (sample_id, (xs, ys, ts)) pairs to a binary stream; returns how many.
+    # Instead of columns a pair may hold a trajectory-like object (see write_sample).
+    # "json" is one {"samples": [...]} document, "ndjson" one sample per line.
+    if format not in FORMATS:
+        raise ExportError(f"unknown format {format!r}")
+    written = 0
+    if format == "json":
+        out.write(b'{"samples": [\n')
+    for sample_id, sample in samples:
+        if isinstance(sample, tuple):
+            sample = Trajectory(*sample)
+        if not len(sample):
+            continue
+        if format == "json" and written:
+            out.write(b',\n')
+        write_sample(out, sample_id, sample)
+        if format == "ndjson":
+            out.write(b'\n')
+        written += 1
+    if format == "json":
+        out.write(b'\n]}\n')
+    return written
+
+
+def store_samples(store, ids=None):
+    # (sample_id, columns) for the samples of a SampleStore, read from the mapped file
+    for sample_id in store.ids() if ids is None else ids:
+        yield sample_id, store.columns(sample_id)
+
+
+def export(path, samples, format=None, compression=None):
+    # Stream samples to `path`; format and compression default to what the file
+    # name says. Returns the number of samples written.
+    guessed_format, guessed_compression = guess_format(path)
+    format = format or guessed_format
+    compression = compression if compression is not None else guessed_compression
+    out, raw = open_stream(path, compression)
+    try:
+        with out:
+            written = write_samples(out, samples, format)
+    finally:
+        if raw is not None:
+            raw.close()
+    return written
@@ -0,0 +1,206 @@
+import numpy as np
+
+# Speed (px/s) below which the pointer counts as resting
+PAUSE_SPEED = 20.0
+
+# Shortest rest (ms) that counts as a pause
+MIN_PAUSE_MS = 100.0
+
+FEATURE_NAMES = (
+    "point_count",
+    "duration",
+    "path_length",
+    "straight_distance",
+    "efficiency",
+    "mean_speed",
+    "max_speed",
+    "std_speed",
+    "mean_abs_acceleration",
+    "max_abs_acceleration",
+    "mean_abs_jerk",
+    "mean_curvature",
+    "max_curvature",
+    "pause_count",
+    "pause_time",
+)
+
+
+def pad(columns_list):
+    # Stack ragged (x, y, t) columns into NaN-padded (batch, longest) arrays.
+    # Returns x, y, t and the number of points of each row.
+    lengths = np.array([len(columns[0]) for columns in columns_list], dtype=np.int64)
+    batch = len(lengths)
+    width = int(lengths.max()) if batch else 0
+
+    rows = np.repeat(np.arange(batch), lengths)
+    starts = np.cumsum(lengths) - lengths
+    cols = np.arange(int(lengths.sum())) - np.repeat(starts, lengths)
+
+    padded = []
+    for axis in range(3):
+        flat = np.concatenate([np.asarray(columns[axis], dtype=np.float64) for columns in columns_list]) if batch else np.empty(0)
+        out = np.full((batch, width), np.nan)
+        out[rows, cols] = flat
+        padded.append(out)
+    return padded[0], padded[1], padded[2], lengths
+
+
+def flatten(columns_list):
+    # Concatenate ragged (x, y, t) columns into flat float64 arrays. Returns x, y,
+    # t, the number of points of each trajectory and where each one starts.
+    lengths = np.array([len(columns[0]) for columns in columns_list], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    flat = []
+    for axis in range(3):
+        parts = [np.asarray(columns[axis], dtype=np.float64) for columns in columns_list]
+        flat.append(np.concatenate(parts) if parts else np.empty(0))
+    return flat[0], flat[1], flat[2], lengths, starts
+
+
+def following(values, fill=0.0):
+    # values shifted one position to the left: the next step of every step
+    out = np.empty_like(values)
+    out[:-1] = values[1:]
+    out[-1:] = fill
+    return out
+
+
+class Rows:
+    # Per-trajectory reductions over flat per-step arrays; position p holds the
+    # step from point p to point p + 1, and steps that would cross into the next
+    # trajectory are masked out by the callers
+
+    def __init__(self, lengths, starts):
+        self.batch = len(lengths)
+        self.row = np.repeat(np.arange(self.batch), lengths)
+        self.starts = starts
+        self.empty = lengths == 0
+
+    def count(self, mask):
+        return np.bincount(self.row, weights=mask, minlength=self.batch)
+
+    def sum(self, values, mask):
+        return np.bincount(self.row, weights=np.where(mask, values, 0.0), minlength=self.batch)
+
+    def mean(self, values, mask):
+        counts = self.count(mask)
+        return np.divide(self.sum(values, mask), counts, out=np.zeros(self.batch), where=counts > 0)
+
+    def max(self, values, mask):
+        masked = np.where(mask, values, -np.inf)
+        if not len(masked):
+            return np.zeros(self.batch)
+        out = np.maximum.reduceat(masked, np.minimum(self.starts, len(masked) - 1))
+        return np.where(np.isfinite(out) & ~self.empty, out, 0.0)
+
+    def std(self, values, mask):
+        mean = self.mean(values, mask)
+        return np.sqrt(self.mean((values - mean[self.row]) ** 2, mask))
+
+
+def derivative(values, dt, mask):
+    # Finite difference of per-step values over the time between the step
+    # midpoints, valid where both neighbouring steps are
+    step = (following(dt) + dt) / 2
+    both = following(mask, False) & mask & (step > 0)
+    out = np.divide(following(values) - values, step, out=np.zeros_like(step), where=both)
+    return out, both
+
+
+def extract(columns_list):
+    # Feature matrix (batch, len(FEATURE_NAMES)) for a batch of (x, y, t) columns,
+    # with t in ms. All trajectories are processed together on their concatenated
+    # columns, so memory grows with the total number of points, not with the
+    # batch times the longest trajectory.
+    x, y, t, lengths, starts = flatten(columns_list)
+    batch = len(lengths)
+    if batch == 0:
+        return np.empty((0, len(FEATURE_NAMES)))
+    rows = Rows(lengths, starts)
+
+    # The step from the last point of a trajectory leads into the next one
+    step_valid = np.ones(len(x), dtype=bool)
+    step_valid[(starts + lengths - 1)[lengths > 0]] = False
+    dx = np.where(step_valid, following(x) - x, 0.0)
+    dy = np.where(step_valid, following(y) - y, 0.0)
+    dt = np.where(step_valid, (following(t) - t) / 1000.0, 0.0)
+
+    ds = np.hypot(dx, dy)
+    timed = step_valid & (dt > 0)
+    speed = np.divide(ds, dt, out=np.zeros_like(ds), where=timed)
+    acceleration, accel_valid = derivative(speed, dt, timed)
+    jerk, jerk_valid = derivative(acceleration, following(dt), accel_valid)
+
+    # Curvature: change of heading per pixel travelled, between moving steps
+    heading = np.arctan2(dy, dx)
+    turn = np.abs((following(heading) - heading + np.pi) % (2 * np.pi) - np.pi)
+    moving = step_valid & (ds > 0)
+    turn_valid = following(moving, False) & moving
+    curvature = np.divide(turn, following(ds), out=np.zeros_like(turn), where=turn_valid)
+
+    first = np.minimum(starts, max(len(x) - 1, 0))
+    last = np.maximum(starts + lengths - 1, 0)
+    duration = t[last] - t[first]
+    path_length = rows.sum(ds, step_valid)
+    straight = np.hypot(x[last] - x[first], y[last] - y[first])
+    efficiency = np.divide(straight, path_length, out=np.ones(batch), where=path_length > 0)
+
+    pause_count, pause_time = pauses(rows, speed, dt, step_valid)
+
+    features = np.column_stack((
+        lengths.astype(np.float64),
+        duration,
+        path_length,
+        straight,
+        efficiency,
+        rows.mean(speed, timed),
+        rows.max(speed, timed),
+        rows.std(speed, timed),
+        rows.mean(np.abs(acceleration), accel_valid),
+        rows.max(np.abs(acceleration), accel_valid),
+        rows.mean(np.abs(jerk), jerk_valid),
+        rows.mean(curvature, turn_valid),
+        rows.max(curvature, turn_valid),
+        pause_count,
+        pause_time,
+    ))
+    return features
+
+
+def pauses(rows, speed, dt, valid):
+    # Number and total duration (ms) of runs of slow steps lasting at least
+    # MIN_PAUSE_MS. The last point of a trajectory has no valid step, so runs
+    # never continue into the next one.
+    slow = valid & (speed < PAUSE_SPEED)
+    step_ms = dt * 1000.0
+
+    edges = np.diff(np.concatenate(([0], slow.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    elapsed = np.concatenate(([0.0], np.cumsum(np.where(slow, step_ms, 0.0))))
+    run_ms = elapsed[ends] - elapsed[starts]
+
+    long_enough = run_ms >= MIN_PAUSE_MS
+    run_rows = rows.row[starts[long_enough]]
+    count = np.bincount(run_rows, minlength=rows.batch).astype(np.float64)
+    total = np.bincount(run_rows, weights=run_ms[long_enough], minlength=rows.batch)
+    return count, total
+
+
+class FeatureCache:
+    # Feature rows per sample id, so only samples that were added since the last
+    # run have to be extracted; TrainingJob fills it from its workers
+
+    def __init__(self):
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, sample_id, columns):
+        # Features of a sample that was edited, from its columns rounded to
+        # float32 like the library stores them
+        self.rows[sample_id] = extract([[np.asarray(column, dtype=np.float32) for column in columns]])[0]
+
+    def clear(self):
+        self.rows = {}
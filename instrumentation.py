@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Interval of the heartbeat timer that measures event loop lag
+HEARTBEAT_MS = 50
+
+# Interval at which gauges are sampled and the overlay is refreshed
+GAUGE_MS = 500
+
+# Most trace events kept for the Chrome trace; older ones are dropped
+MAX_EVENTS = 200000
+
+
+class Stat:
+    # Count, total and worst duration of one callback (or lag samples), in ns
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.last = 0
+
+    def add(self, ns):
+        self.count += 1
+        self.total += ns
+        self.last = ns
+        if ns > self.max:
+            self.max = ns
+
+    def summary(self):
+        mean = self.total / self.count if self.count else 0
+        return {"count": self.count, "total_ms": self.total / 1e6, "mean_us": mean / 1e3,
+                "max_us": self.max / 1e3, "last_us": self.last / 1e3}
+
+
+class Profiler:
+    # Times Tk callbacks and measures event loop lag on the UI thread. Callbacks
+    # are wrapped with instrument() before they are bound, so every call goes
+    # through the timer; samples also go to a bounded event list that can be
+    # written as a Chrome trace (chrome://tracing, Perfetto).
+
+    def __init__(self, clock=time.perf_counter_ns, max_events=MAX_EVENTS):
+        self.clock = clock
+        self.origin = clock()
+        self.stats = {}
+        self.gauges = {}
+        self.events = deque(maxlen=max_events)
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+
+        self.widget = None
+        self.heartbeat_pending = None
+        self.expected = 0
+
+    def stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = Stat()
+        return stat
+
+    def wrap(self, name, function):
+        stat = self.stat(name)
+        clock = self.clock
+        events = self.events
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = clock() - start
+                stat.add(duration)
+                events.append(("X", name, start, duration))
+        return timed
+
+    def instrument(self, owner, names, prefix=""):
+        # Replace the methods `names` of `owner` with timed versions
+        for name in names:
+            setattr(owner, name, self.wrap(prefix + name, getattr(owner, name)))
+
+    def start(self, widget):
+        # Start the heartbeat on the event loop of `widget`
+        self.widget = widget
+        self.expected = self.clock() + HEARTBEAT_MS * 1000000
+        self.heartbeat_pending = widget.after(HEARTBEAT_MS, self.heartbeat)
+
+    def heartbeat(self):
+        # How late this timer fired is how long the event loop was busy elsewhere
+        now = self.clock()
+        lag = max(0, now - self.expected)
+        self.stat("event_loop_lag").add(lag)
+        self.events.append(("C", "event_loop_lag_ms", now, lag / 1e6))
+        self.expected = now + HEARTBEAT_MS * 1000000
+        self.heartbeat_pending = self.widget.after(HEARTBEAT_MS, self.heartbeat)
+
+    def stop(self):
+        if self.heartbeat_pending is not None:
+            self.widget.after_cancel(self.heartbeat_pending)
+            self.heartbeat_pending = None
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+        self.events.append(("C", name, self.clock(), value))
+
+    def summary(self):
+        return {
+            "callbacks": {name: stat.summary() for name, stat in sorted(self.stats.items())},
+            "gauges": dict(self.gauges),
+        }
+
+    def text(self):
+        # A few lines for the stats overlay
+        lines = []
+        for name, stat in sorted(self.stats.items()):
+            if stat.count:
+                lines.append(f"{name}: {stat.count}x  mean {stat.total / stat.count / 1e3:.1f} us  max {stat.max / 1e3:.0f} us")
+        lines.extend(f"{name}: {value}" for name, value in sorted(self.gauges.items()))
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        trace = []
+        for kind, name, ts, value in self.events:
+            event = {"name": name, "ph": kind, "ts": (ts - self.origin) / 1e3, "pid": self.pid, "tid": self.tid}
+            if kind == "X":
+                event["dur"] = value / 1e3
+            else:
+                event["args"] = {name: value}
+            trace.append(event)
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def dump(self, path, format="json"):
+        # Write the summary ("json") or the recorded events ("chrome")
+        data = self.chrome_trace() if format == "chrome" else self.summary()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=1 if format == "json" else None)
+
+
+class StatsOverlay:
+    # Periodically samples gauges and shows the profiler's numbers in a corner of
+    # the canvas. `gauges` returns a dict of name -> value.
+
+    def __init__(self, canvas, profiler, gauges, tag="stats"):
+        self.canvas = canvas
+        self.profiler = profiler
+        self.gauges = gauges
+        self.tag = tag
+        self.visible = False
+        self.pending = None
+
+    def start(self):
+        self.pending = self.canvas.after(GAUGE_MS, self.refresh)
+
+    def refresh(self):
+        for name, value in self.gauges().items():
+            self.profiler.gauge(name, value)
+        if self.visible:
+            self.draw()
+        self.pending = self.canvas.after(GAUGE_MS, self.refresh)
+
+    def draw(self):
+        self.canvas.delete(self.tag)
+        self.canvas.create_text(8, 8, anchor="nw", text=self.profiler.text(), font=("TkFixedFont", 8), fill="gray25", tags=self.tag)
+
+    def toggle(self, event=None):
+        self.visible = not self.visible
+        if self.visible:
+            self.draw()
+        else:
+            self.canvas.delete(self.tag)
+
+    def stop(self):
+        if self.pending is not None:
+            self.canvas.after_cancel(self.pending)
+            self.pending = None
@@ -1,8 +1,13 @@
+import argparse
 import tkinter as tk
-import time
+
+from dot_layer import DotLayer
+from recorded_text import FRAME_MS, RecordedText
+from recorder import Recorder
+from sampler import PointerSampler
 
 class DrawingApp:
-    def __init__(self, master):
+    def __init__(self, master, sample_rate=None):
         self.master = master
         self.master.title("Point Recorder")
 
@@ -31,11 +36,8 @@ class DrawingApp:
         self.text_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.text_entry.config(yscrollcommand=self.text_scrollbar.set)
 
-        # List to store recorded coordinates
-        self.coordinates = []
-
-        # Boolean to indicate recording status
-        self.recording = False
+        # Incrementally updated contents of the text entry widget
+        self.recorded_text = RecordedText(self.text_entry)
 
         # Boolean to indicate dragging status
         self.dragging = False
@@ -49,6 +51,9 @@ class DrawingApp:
         self.canvas.pack(fill=tk.BOTH, expand=True)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
+        # Frame-coalesced drawing of the recorded coordinates
+        self.dots = DotLayer(self.canvas)
+
         # Draw A button
         self.a_size = 50 * 10  # 10 times bigger
         self.a_x_cm = 0.05  # Move 0.05 cm to the left
@@ -67,6 +72,7 @@ class DrawingApp:
         self.canvas.bind("<B1-Motion>", self.move_point_start)
         self.canvas.bind("<ButtonRelease-1>", self.move_point_end)
         self.canvas.bind("<Motion>", self.draw_dot)
+        self.canvas.bind("<Leave>", self.on_leave_canvas)
 
         # Buttons below recorder
         self.button_frame = tk.Frame(master)
@@ -99,13 +105,23 @@ class DrawingApp:
         # Timer for recording mouse movement
         self.timer_running = False
         self.last_recorded_time = 0
-        self.start_time = 0
+
+        # Recording state machine; with a sample rate it uses a fixed-rate pointer
+        # sampler, otherwise samples come from <Motion> events and the 500 ms poll
+        self.recorder = Recorder(sampler=PointerSampler(sample_rate) if sample_rate else None)
+
+    @property
+    def coordinates(self):
+        return self.recorder.coordinates
+
+    @property
+    def recording(self):
+        return self.recorder.recording
 
     def start_recording(self, event=None, tag=None):
-        self.recording = True
+        self.recorder.start()
         self.label.config(text="Recording...")
-        self.coordinates = []  # Reset coordinates list
-        self.start_time = time.time()  # Record start time
+        self.recorded_text.reset()
 
         # Start timer for recording mouse movement
         if not self.timer_running:
@@ -113,9 +129,11 @@ class DrawingApp:
             self.record_mouse_movement()
 
     def stop_recording(self, event=None):
-        self.recording = False
+        self.recorder.stop()
         self.label.config(text="Click on A to start recording.")
         self.timer_running = False
+        self.dots.update(self.coordinates)
+        self.update_recorded_text()
 
     def toggle_recording(self, event=None, tag=None):
         if self.recording:
@@ -124,6 +142,13 @@ class DrawingApp:
             self.start_recording(tag=tag)
 
     def record_mouse_movement(self):
+        if self.recorder.sampler is not None:
+            # Pick up everything the sampler thread captured since the last frame
+            self.drain_samples()
+            if self.timer_running:
+                self.master.after(FRAME_MS, self.record_mouse_movement)
+            return
+
         if self.recording:
          x = self.canvas.canvasx(self.canvas.winfo_pointerx())
          y = self.canvas.canvasy(self.canvas.winfo_pointery())
@@ -131,40 +156,22 @@ class DrawingApp:
          canvas_height = self.canvas.winfo_height()
          if 0 <= x <= canvas_width and 0 <= y <= canvas_height:
             if not self.canvas.find_withtag(tk.CURRENT) and not self.canvas.find_withtag("Button", "tag"):  # Check if the mouse is not over any button
-                current_time = int((time.time() - self.start_time) * 1000)  # Time since recording started
-                self.coordinates.append({"x": x, "y": y, "t": current_time})
-                self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='black', tags="dot")  # Draw smaller square on canvas
-                self.update_recorded_text()  # Update recorded text
-        self.master.after(500, self.record_mouse_movement)
+                if self.recorder.add_sample(x, y):
+                    self.dots.update(self.coordinates)  # Draw the new point with the next frame
+                    self.update_recorded_text()  # Update recorded text
+        if self.timer_running:
+            self.master.after(500, self.record_mouse_movement)
+
+    def drain_samples(self):
+        # Move pending samples from the sampler's ring buffer into the coordinates and draw them
+        if self.recorder.drain():
+            self.dots.update(self.coordinates)  # Draw the new points with the next frame
+            self.update_recorded_text()  # Update recorded text
 
 
     def update_recorded_text(self):
-        # Clear the text entry widget
-        self.text_entry.delete(1.0, tk.END)
-
-        # Add A coordinates
-        self.text_entry.insert(tk.END, '"A": {\n')
-        self.text_entry.insert(tk.END, f'    "x": {self.coordinates[0]["x"]},\n')
-        self.text_entry.insert(tk.END, f'    "y": {self.coordinates[0]["y"]},\n')
-        self.text_entry.insert(tk.END, f'    "t": 0\n')
-        self.text_entry.insert(tk.END, '},\n')
-
-        # Add B coordinates
-        self.text_entry.insert(tk.END, '"B": {\n')
-        self.text_entry.insert(tk.END, f'    "x": {self.coordinates[-1]["x"]},\n')
-        self.text_entry.insert(tk.END, f'    "y": {self.coordinates[-1]["y"]},\n')
-        self.text_entry.insert(tk.END, f'    "t": {self.coordinates[-1]["t"]}\n')
-        self.text_entry.insert(tk.END, '},\n')
-
-        # Add points coordinates
-        self.text_entry.insert(tk.END, '"points": [\n')
-        for point in self.coordinates[1:-1]:
-            self.text_entry.insert(tk.END, '    {\n')
-            self.text_entry.insert(tk.END, f'        "x": {point["x"]},\n')
-            self.text_entry.insert(tk.END, f'        "y": {point["y"]},\n')
-            self.text_entry.insert(tk.END, f'        "t": {point["t"]}\n')
-            self.text_entry.insert(tk.END, '    },\n')
-        self.text_entry.insert(tk.END, '],\n')
+        # Schedule the new points to be appended to the recorded text
+        self.recorded_text.update(self.coordinates)
 
     def move_point_start(self, event):
         if self.recording:
@@ -174,6 +181,10 @@ class DrawingApp:
     def move_point_end(self, event):
         self.dragging = False
 
+    def on_leave_canvas(self, event):
+        # Stop sampling a stale position once the pointer leaves the canvas
+        self.recorder.pointer_left()
+
     def on_canvas_resize(self, event):
         # Update positions of A and B when canvas is resized
         self.a_button.place(relx=self.a_x_cm, rely=self.a_y, anchor="center")
@@ -181,22 +192,22 @@ class DrawingApp:
 
     def remove_last(self):
         # Remove all recorded points from the canvas
-        self.canvas.delete("dot")
+        self.dots.clear()
 
         # Clear the recorded coordinates list
-        self.coordinates = []
+        self.recorder.remove_last()
 
         # Clear the recorded text
-        self.text_entry.delete(1.0, tk.END)
+        self.recorded_text.reset()
 
     def draw_dot(self, event):
         if self.recording:
             x, y = event.x, event.y
             if not self.canvas.find_withtag(tk.CURRENT):  # Check if the mouse is not over any button
-                current_time = int((time.time() - self.start_time) * 1000)  # Time since recording started
-                self.coordinates.append({"x": x, "y": y, "t": current_time})
-                self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='black', tags="dot")  # Draw smaller square on canvas
-                self.update_recorded_text()  # Update recorded text
+                # With a sampler the recorder only notes the position; it samples it itself
+                if self.recorder.pointer_moved(x, y):
+                    self.dots.update(self.coordinates)  # Draw the new point with the next frame
+                    self.update_recorded_text()  # Update recorded text
 
     def play(self):
         # Functionality to play recorded points
@@ -223,9 +234,13 @@ class DrawingApp:
         pass
 
 def main():
+    parser = argparse.ArgumentParser(description="Record A->B pointer paths.")
+    parser.add_argument("--sample-rate", type=int, default=0, metavar="HZ", help="sample the pointer at a fixed rate on a background thread (default: record <Motion> events)")
+    args = parser.parse_args()
+
     root = tk.Tk()
     root.geometry("1200x600")  # Initial window size
-    app = DrawingApp(root)
+    app = DrawingApp(root, sample_rate=args.sample_rate)
     root.mainloop()
 
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+import math
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# File layout (little endian):
+#   header   MAGIC, version, array count, samples, cv log-likelihood (NaN if
+#            none), CRC-32 of everything after the header
+#   table    per array: name, dtype, element count, data offset
+#   data     the raw arrays, each starting on an ALIGN-byte boundary
+# Loading maps the file and wraps the arrays in place, nothing is unpickled.
+MAGIC = b"KSBM"
+VERSION = 1
+ALIGN = 64
+
+HEADER = struct.Struct("<4sIIQdI")
+ENTRY = struct.Struct("<16s8sQQ")
+
+
+class ModelFileError(Exception):
+    pass
+
+
+def align(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def save(path, model):
+    # Write a trained model; the file is replaced atomically
+    names = "\n".join(model["features"]).encode()
+    arrays = [
+        ("features", np.frombuffer(names, dtype=np.uint8)),
+        ("mean", np.ascontiguousarray(model["mean"], dtype="<f8")),
+        ("std", np.ascontiguousarray(model["std"], dtype="<f8")),
+    ]
+    cv = model.get("cv_log_likelihood")
+
+    table = []
+    blobs = []
+    offset = align(HEADER.size + ENTRY.size * len(arrays))
+    for name, values in arrays:
+        table.append(ENTRY.pack(name.encode(), values.dtype.str.encode(), values.size, offset))
+        blobs.append((offset, values.tobytes()))
+        offset = align(offset + values.nbytes)
+
+    body = bytearray(offset - HEADER.size)
+    table = b"".join(table)
+    body[:len(table)] = table
+    for start, data in blobs:
+        body[start - HEADER.size:start - HEADER.size + len(data)] = data
+    header = HEADER.pack(MAGIC, VERSION, len(arrays), model["samples"],
+                         math.nan if cv is None else cv, zlib.crc32(body))
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(header)
+        f.write(body)
+    os.replace(temporary, path)
+
+
+def load(path):
+    # Map a model file and return the model with its arrays backed by the mapping
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ModelFileError(f"{path} is empty") from None
+
+    if len(data) < HEADER.size:
+        raise ModelFileError(f"{path} is not a model file")
+    magic, version, count, samples, cv, checksum = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ModelFileError(f"{path} is not a model file")
+    if version != VERSION:
+        raise ModelFileError(f"{path} has unsupported version {version}")
+    if zlib.crc32(memoryview(data)[HEADER.size:]) != checksum:
+        raise ModelFileError(f"{path} is damaged (checksum mismatch)")
+
+    arrays = {}
+    for i in range(count):
+        name, dtype, size, offset = ENTRY.unpack_from(data, HEADER.size + i * ENTRY.size)
+        dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        if offset % ALIGN or offset + size * dtype.itemsize > len(data):
+            raise ModelFileError(f"{path} is damaged (bad array table)")
+        arrays[name.rstrip(b"\0").decode()] = np.frombuffer(data, dtype=dtype, count=size, offset=offset)
+
+    if not {"features", "mean", "std"} <= arrays.keys():
+        raise ModelFileError(f"{path} is missing model arrays")
+    return {
+        "features": tuple(arrays["features"].tobytes().decode().split("\n")),
+        "mean": arrays["mean"],
+        "std": arrays["std"],
+        "samples": samples,
+        "cv_log_likelihood": None if math.isnan(cv) else cv,
+        "path": path,
+    }
@@ -1,12 +1,88 @@
 
-import tkinter as tk
 import time
 
+# Taken before anything else is imported; the time to first paint is measured
+# from process start where the OS reports it, and from here otherwise
+IMPORTED = time.perf_counter()
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from backends import BackendLoader
+from dot_layer import DotLayer
+from endpoint_frame import FRAME_LENGTH, EndpointFrame
+from export import ExportError, export, store_samples
+from instrumentation import StatsOverlay
+from playback import Playback
+from recorded_text import FRAME_MS, RecordedText
+from recorder import Recorder
+from sample_store import SampleStore, SampleStoreError
+from sample_writer import SampleWriter
+from sampler import PointerSampler
+from session_log import TAIL_POINTS, SessionLog, SessionLogError
+from simplify import StreamingSimplifier
+from spatial_index import GridIndex
+from trajectory import Trajectory
+
+# File that finished A->B recordings are appended to
+SAMPLES_PATH = "samples.ksb"
+
+# File next to the library that a long session spills its older points to
+SESSION_FILE = "session.ksl"
+
+# How close (px) a click has to be to a recorded point to pick it up
+HIT_RADIUS = 6
+
+# Range of relative positions A and B are moved to between passes in batch mode
+BATCH_A_X = (0.03, 0.3)
+BATCH_B_X = (0.7, 0.97)
+BATCH_Y = (0.1, 0.9)
+
+# Colours of the paths of further models when Test compares several
+COMPARE_COLORS = ("blue", "green", "orange", "purple", "brown")
+
+# Paths generated per model to score it against the library in Test
+COMPARE_PATHS = 16
+
+# Seed of the augmented copies made for training, so training twice on the same
+# library gives the same model
+AUGMENT_SEED = 0
+
+# Callbacks timed when the app runs with a profiler
+CALLBACKS = ("draw_dot", "record_mouse_movement", "drain_samples", "update_recorded_text",
+             "display_play_dot", "on_canvas_resize", "select_point", "move_point_start",
+             "toggle_recording", "poll_training")
+
+def process_started():
+    # perf_counter() at the start of the process, from its start time in
+    # /proc/self/stat (in clock ticks since boot, so to about 10 ms), or the
+    # import of this module where there is no /proc
+    try:
+        with open("/proc/self/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        started = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return IMPORTED
+    return time.perf_counter() - (uptime - started)
+
 class DrawingApp:
-    def __init__(self, master):
+    def __init__(self, master, sample_rate=None, samples_path=SAMPLES_PATH, profiler=None, augment_seed=AUGMENT_SEED,
+                 session_tail=TAIL_POINTS):
         self.master = master
         self.master.title("Point Recorder")
 
+        # Optional instrumentation.Profiler; callbacks are wrapped before Tk binds them
+        self.profiler = profiler
+        if profiler is not None:
+            profiler.instrument(self, CALLBACKS)
+
         # Frame for recorded side
         self.coord_frame = tk.Frame(master, width=300, bd=2, relief=tk.RAISED)
         self.coord_frame.pack(side=tk.LEFT, fill=tk.Y)
@@ -28,11 +104,8 @@ class DrawingApp:
         self.text_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.text_entry.config(yscrollcommand=self.text_scrollbar.set)
 
-        # List to store recorded coordinates
-        self.coordinates = []
-
-        # Boolean to indicate recording status
-        self.recording = False
+        # Incrementally updated contents of the text entry widget
+        self.recorded_text = RecordedText(self.text_entry)
 
         # Canvas frame
         self.canvas_frame = tk.Frame(master)
@@ -43,6 +116,9 @@ class DrawingApp:
         self.canvas.pack(fill=tk.BOTH, expand=True)
         self.canvas.bind("<Configure>", self.on_canvas_resize)
 
+        # Frame-coalesced drawing of the recorded coordinates
+        self.dots = DotLayer(self.canvas)
+
         # Draw A button
         self.a_size = 50 * 10  # 10 times bigger
         self.a_x_cm = 0.05  # Move 0.05 cm to the left
@@ -71,9 +147,11 @@ class DrawingApp:
         self.b_button.bind("<ButtonRelease-1>", self.stop_dragging)
 
         # Binding mouse events to the canvas
+        self.canvas.bind("<ButtonPress-1>", self.select_point)
         self.canvas.bind("<B1-Motion>", self.move_point_start)
         self.canvas.bind("<ButtonRelease-1>", self.move_point_end)
         self.canvas.bind("<Motion>", self.draw_dot)
+        self.canvas.bind("<Leave>", self.on_leave_canvas)
 
         # Frame for buttons below canvas
         self.button_frame = tk.Frame(master)
@@ -92,34 +170,159 @@ class DrawingApp:
         self.clear_button = tk.Button(self.button_frame, text="Clear Samples", command=self.clear_samples)
         self.clear_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        self.train_button = tk.Button(self.button_frame, text="Train Model", command=self.train_model)
+        self.train_button = tk.Button(self.button_frame, text="Train Model", command=self.train_model, state=tk.DISABLED)
         self.train_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        self.save_button = tk.Button(self.button_frame, text="Save Model", command=self.save_model)
+        self.save_button = tk.Button(self.button_frame, text="Save Model", command=self.save_model, state=tk.DISABLED)
         self.save_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        self.load_button = tk.Button(self.button_frame, text="Load Model", command=self.load_model)
+        self.load_button = tk.Button(self.button_frame, text="Load Model", command=self.load_model, state=tk.DISABLED)
         self.load_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        self.test_button = tk.Button(self.button_frame, text="Test", command=self.test)
+        self.test_button = tk.Button(self.button_frame, text="Test", command=self.test, state=tk.DISABLED)
         self.test_button.pack(side=tk.LEFT, padx=5, pady=5)
 
-        # Timer for recording mouse movement
+        self.export_button = tk.Button(self.button_frame, text="Export", command=self.export_samples)
+        self.export_button.pack(side=tk.LEFT, padx=5, pady=5)
+
+        # Simplify passes while recording instead of keeping every raw sample
+        self.simplify_var = tk.BooleanVar(value=False)
+        self.simplify_check = tk.Checkbutton(self.button_frame, text="Simplify", variable=self.simplify_var)
+        self.simplify_check.pack(side=tk.LEFT, padx=5, pady=5)
+
+        # Batch capture: move A and B to new random places after every pass
+        self.batch_var = tk.BooleanVar(value=False)
+        self.batch_check = tk.Checkbutton(self.button_frame, text="Batch", variable=self.batch_var)
+        self.batch_check.pack(side=tk.LEFT, padx=5, pady=5)
+        self.random = random.Random()
+
+        # Long session: keep only the last points in memory and on the canvas,
+        # and spill older ones to disk
+        self.long_session_var = tk.BooleanVar(value=False)
+        self.long_session_check = tk.Checkbutton(self.button_frame, text="Long session", variable=self.long_session_var)
+        self.long_session_check.pack(side=tk.LEFT, padx=5, pady=5)
+
+        # Timer for recording mouse movement. Without a sampler it also polls the
+        # pointer position unless poll_pointer is off (e.g. when replaying events).
         self.timer_running = False
+        self.poll_pointer = True
+
+        # Canvas size as of the last <Configure>, so motion events need no winfo calls
+        self.canvas_size = (0, 0)
         self.last_recorded_time = 0
-        self.start_time = 0
 
         # Boolean flag to indicate if mouse is over A or B buttons
         self.mouse_over_button = False
 
-        # Store drawn dots during playback
-        self.play_dots = []
+        # Boolean to indicate dragging status, and whether A or B actually moved
+        self.dragging = False
+        self.drag_moved = False
+
+        # Spatial index over the recorded points, the point being dragged, and the
+        # corner and result of a box selection
+        self.point_index = GridIndex()
+        self.drag_index = None
+        self.box_start = None
+        self.selection = []
+
+        # Points drawn during playback and the layer that draws them
+        self.play_dots = Trajectory()
+        self.play_layer = DotLayer(self.canvas, tag="play_dot", fill="red")
+
+        # Library of finished recordings
+        self.samples = SampleStore(samples_path)
+
+        # Finished passes are queued and written to the library on a background thread
+        self.writer = SampleWriter(self.samples)
+
+        # Recording state machine; with a sample rate it uses a fixed-rate pointer
+        # sampler, otherwise samples come from <Motion> events and the 500 ms poll
+        self.recorder = Recorder(self.writer, PointerSampler(sample_rate) if sample_rate else None)
+        self.simplifier = StreamingSimplifier()
+
+        # Log of the spilled part of a long session, opened with the first one,
+        # and how many points such a session keeps in memory
+        self.session_path = os.path.join(os.path.dirname(samples_path), SESSION_FILE)
+        self.session_log = None
+        self.session_tail = session_tail
+
+        # Map between canvas pixels and the A->B frame samples are recorded in;
+        # rebuilt whenever the canvas or the buttons change
+        self.frame = None
+
+        # Trajectory features per sample id, and the model trained from them
+        self.features = None
+        self.model = None
+
+        # Models loaded from files by path, compared side by side in Test, and
+        # the layers drawing their paths
+        self.models = {}
+        self.model_file = None
+        self.compare_layers = []
+
+        # Resampled library for comparing test paths with the recorded ones, kept
+        # up to date on a background thread; "euclidean", "cosine" or "dtw"
+        self.similarity = None
+        self.similarity_metric = "euclidean"
+
+        # NumPy and the modules built on it load in the background once the window
+        # is up; the buttons that need them stay disabled until then
+        self.training_module = None
+        self.synthesis = None
+        self.backends = BackendLoader(master, self.backends_failed)
+        self.backends.load(("features", "training", "model_file"), self.training_ready)
+        self.backends.load(("synthesis", "similarity"), self.test_ready)
+
+        # Milliseconds from process start to the first paint of the canvas
+        self.first_paint_ms = None
+        self.canvas.bind("<Expose>", self.on_first_paint)
+
+        # Training running in the background, if any, and how many augmented
+        # copies of each sample it adds (0: none; the seed makes them repeatable,
+        # None draws a new one every run)
+        self.training = None
+        self.augment_copies = 4
+        self.augment_seed = augment_seed
+
+        # Current playback, and its speed relative to the recording (None: as fast as possible)
+        self.playback = None
+        self.play_speed = 1.0
+
+        # Event loop lag, frame flushes and gauges; F2 shows them on the canvas
+        self.stats = None
+        if profiler is not None:
+            profiler.instrument(self.recorded_text, ("flush",), "recorded_text.")
+            profiler.instrument(self.dots, ("flush",), "dots.")
+            profiler.instrument(self.play_layer, ("flush",), "play_layer.")
+            profiler.start(master)
+            self.stats = StatsOverlay(self.canvas, profiler, self.gauges)
+            self.stats.start()
+            self.master.bind("<F2>", self.stats.toggle)
+
+    @property
+    def coordinates(self):
+        return self.recorder.coordinates
+
+    @property
+    def recording(self):
+        return self.recorder.recording
 
     def start_recording(self, event=None, tag=None):
-        self.recording = True
+        self.recorder.simplifier = self.simplifier if self.simplify_var.get() else None
+        if self.batch_var.get():
+            self.dots.clear()  # Nobody waits 5 seconds between passes in a batch
+        if self.long_session_var.get():
+            if self.session_log is None:
+                self.session_log = SessionLog(self.session_path)
+                self.recorded_text.log = self.session_log
+            self.stop_playback()  # It may be reading the log that is about to be emptied
+            self.recorder.log = self.session_log
+            self.recorder.tail = self.session_tail
+        else:
+            self.recorder.tail = None
+        self.recorder.start()
         self.label.config(text="Recording...")
-        self.coordinates = []  # Reset coordinates list
-        self.start_time = time.time()  # Record start time
+        self.recorded_text.reset()
 
         # Start timer for recording mouse movement
         if not self.timer_running:
@@ -127,100 +330,118 @@ class DrawingApp:
             self.record_mouse_movement()
 
     def stop_recording(self, event=None):
-        self.recording = False
+        # The recorder queues the finished A->B pass for the sample library
+        try:
+            sample_id = self.recorder.stop()
+        except (SampleStoreError, SessionLogError, OSError) as error:
+            messagebox.showerror("Sample library", f"Could not save samples: {error}")
+            sample_id = None
         self.label.config(text="Click on A to start recording.")
         self.timer_running = False
         self.update_recorded_text()  # Update recorded text
         self.redraw_dots()  # Redraw dots on canvas
 
+        if sample_id is not None:
+            kept = self.recorder.compression()
+            kept = "" if kept is None else f", kept {kept:.0%} of points"
+            self.label.config(text=f"Saved sample {sample_id} ({len(self.writer)} in library{kept}). Click on A to start recording.")
+        session = self.recorder.session()
+        if session is not None:
+            self.label.config(text=f"Long session of {len(session)} points, {len(session.log)} of them on disk. "
+                                   "Play and Export read it back. Click on A to start recording.")
+
     def toggle_recording(self, event=None, tag=None):
         if not self.recording:
             self.start_recording(tag=tag)
         else:
             self.stop_recording()
-            self.master.after(5000, self.clear_dots)  # Clear dots after 5 seconds
+            if self.batch_var.get():
+                self.next_endpoints()
+            else:
+                self.master.after(5000, self.clear_dots)  # Clear dots after 5 seconds
+
+    def next_endpoints(self):
+        # Move A and B to new random places for the next pass of a batch
+        self.a_x_cm = self.random.uniform(*BATCH_A_X)
+        self.a_y = self.random.uniform(*BATCH_Y)
+        self.b_x = self.random.uniform(*BATCH_B_X)
+        self.b_y = self.random.uniform(*BATCH_Y)
+        self.place_buttons()
+        self.update_frame(self.canvas.winfo_width(), self.canvas.winfo_height())
 
     def clear_dots(self):
         if not self.recording:
-            self.canvas.delete("dot")
+            self.dots.clear()
 
     def record_mouse_movement(self):
-        if self.recording:
-            x = self.canvas.canvasx(self.canvas.winfo_pointerx())
-            y = self.canvas.canvasy(self.canvas.winfo_pointery())
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
+        if self.recorder.sampler is not None:
+            # Pick up everything the sampler thread captured since the last frame
+            self.drain_samples()
+            if self.timer_running:
+                self.master.after(FRAME_MS, self.record_mouse_movement)
+            return
+
+        if self.recording and self.poll_pointer:
+            # The pointer position is on the screen; make it canvas-local like event.x
+            x = self.canvas.canvasx(self.canvas.winfo_pointerx() - self.canvas.winfo_rootx())
+            y = self.canvas.canvasy(self.canvas.winfo_pointery() - self.canvas.winfo_rooty())
+            canvas_width, canvas_height = self.canvas_size
             
             # Check if the mouse is within the canvas boundaries and not over A or B buttons
             if 0 <= x <= canvas_width and 0 <= y <= canvas_height and not self.mouse_over_button:
-                current_time = int((time.time() - self.start_time) * 1000)  # Time since recording started
-                self.coordinates.append({"x": x, "y": y, "t": current_time})
-                self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='black', tags="dot")  # Draw smaller square on canvas
-                self.update_recorded_text()  # Update recorded text
-        self.master.after(500, self.record_mouse_movement)
+                if self.recorder.add_sample(x, y):
+                    self.dots.update(self.coordinates)  # Draw the new point with the next frame
+                    self.update_recorded_text()  # Update recorded text
+        if self.timer_running:
+            self.master.after(500, self.record_mouse_movement)
+
+    def drain_samples(self):
+        # Move pending samples from the sampler's ring buffer into the coordinates and draw them
+        if self.recorder.drain():
+            self.dots.update(self.coordinates)  # Draw the new points with the next frame
+            self.update_recorded_text()  # Update recorded text
 
     def update_recorded_text(self):
-        # Clear the text entry widget
-        self.text_entry.delete(1.0, tk.END)
-
-        # Add A coordinates
-        self.text_entry.insert(tk.END, '"A": {\n')
-        self.text_entry.insert(tk.END, f'    "x": {self.coordinates[0]["x"]},\n')
-        self.text_entry.insert(tk.END, f'    "y": {self.coordinates[0]["y"]},\n')
-        self.text_entry.insert(tk.END, f'    "t": 0\n')
-        self.text_entry.insert(tk.END, '},\n')
-
-        # Add B coordinates
-        self.text_entry.insert(tk.END, '"B": {\n')
-        self.text_entry.insert(tk.END, f'    "x": {self.coordinates[-1]["x"]},\n')
-        self.text_entry.insert(tk.END, f'    "y": {self.coordinates[-1]["y"]},\n')
-        self.text_entry.insert(tk.END, f'    "t": {self.coordinates[-1]["t"]}\n')
-        self.text_entry.insert(tk.END, '},\n')
-
-        # Add points coordinates
-        self.text_entry.insert(tk.END, '"points": [\n')
-        for point in self.coordinates[1:-1]:
-            self.text_entry.insert(tk.END, '    {\n')
-            self.text_entry.insert(tk.END, f'        "x": {point["x"]},\n')
-            self.text_entry.insert(tk.END, f'        "y": {point["y"]},\n')
-            self.text_entry.insert(tk.END, f'        "t": {point["t"]}\n')
-            self.text_entry.insert(tk.END, '    },\n')
-        self.text_entry.insert(tk.END, '],\n')
+        # Schedule the new points to be appended to the recorded text
+        self.recorded_text.update(self.coordinates)
 
     def redraw_dots(self):
         # Redraw dots on the canvas based on recorded coordinates
-        self.canvas.delete("dot")  # Clear existing dots
-        for point in self.coordinates:
-            x = point["x"]
-            y = point["y"]
-            self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='black', tags="dot")  # Draw dot
+        self.dots.redraw(self.coordinates)
 
     def draw_dot(self, event):
         if self.recording and not self.mouse_over_button:
             x, y = event.x, event.y
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
+            canvas_width, canvas_height = self.canvas_size
             
             # Check if the mouse is within the canvas boundaries and not over A or B buttons
             if 0 <= x <= canvas_width and 0 <= y <= canvas_height and not self.mouse_over_button:
-                current_time = int((time.time() - self.start_time) * 1000)  # Time since recording started
-                self.coordinates.append({"x": x, "y": y, "t": current_time})
-                self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='black', tags="dot")  # Draw smaller square on canvas
+                # With a sampler the recorder only notes the position; it samples it itself
+                if self.recorder.pointer_moved(x, y):
+                    self.dots.update(self.coordinates)  # Draw the new point with the next frame
 
     def on_enter_button(self, event):
         self.mouse_over_button = True
+        self.recorder.pointer_left()
 
     def on_leave_button(self, event):
         self.mouse_over_button = False
 
+    def on_leave_canvas(self, event):
+        # Stop sampling a stale position once the pointer leaves the canvas
+        self.recorder.pointer_left()
+
     def start_dragging(self, event):
         if event.widget == self.a_button or event.widget == self.b_button:
             self.dragging = True
+            self.drag_moved = False
             self.drag_start_x = event.x_root
             self.drag_start_y = event.y_root
 
     def drag(self, event):
         if self.dragging:
+            self.drag_moved = True
+
             # Calculate the movement distance
             delta_x = event.x_root - self.drag_start_x
             delta_y = event.y_root - self.drag_start_y
@@ -240,6 +461,15 @@ class DrawingApp:
             self.drag_start_y = event.y_root
 
     def stop_dragging(self, event):
+        if self.dragging and self.drag_moved:
+            # Keep the new place relative to the canvas size, and record in its frame
+            width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+            ax, ay = self.button_center(self.a_button)
+            bx, by = self.button_center(self.b_button)
+            self.a_x_cm, self.a_y = ax / width, ay / height
+            self.b_x, self.b_y = bx / width, by / height
+            self.place_buttons()
+            self.update_frame(width, height)
         self.dragging = False
 
     def redraw_buttons(self):
@@ -254,84 +484,444 @@ class DrawingApp:
         self.b_button.place(x=b_x, y=b_y)
 
     def play(self):
+        # Pressing Play while a playback is running pauses or resumes it
+        if self.playback is not None and not self.playback.finished:
+            if self.playback.paused:
+                self.playback.resume()
+            else:
+                self.playback.pause()
+            return
+
         if self.coordinates:
             self.clear_play_dots()  # Clear previously stored dots
 
-            # Calculate total time elapsed from the first recorded point to the last
-            total_time = self.coordinates[-1]["t"]
-
-            # Display dots sequentially with delays to simulate recorded timeline
-            for point in self.coordinates:
-                x = point["x"]
-                y = point["y"]
-                t = point["t"]
-                delay = (t / total_time) * 1000  # Convert time to milliseconds
-
-                # Schedule the display of each dot with the appropriate delay
-                self.master.after(int(delay), lambda x=x, y=y: self.display_play_dot(x, y))
+            # Display dots frame by frame following the recorded timeline; a long
+            # session is streamed back from its log
+            trajectory = self.recorder.session() or self.coordinates
+            self.playback = Playback(self.master, trajectory, self.display_play_dot, speed=self.play_speed)
+            self.playback.start()
 
     def display_play_dot(self, x, y):
         # Display a single dot at given coordinates
-        dot = self.canvas.create_rectangle(x - 1, y - 1, x + 1, y + 1, fill='red', tags="play_dot")
-        self.play_dots.append(dot)  # Store dot reference for future manipulation
+        self.play_dots.append(x, y, 0)
+        tail = self.recorder.tail
+        if tail is not None and len(self.play_dots) >= 2 * tail:
+            self.play_dots.drop_front(tail)  # Only the tail of a long session stays on the canvas
+        self.play_layer.update(self.play_dots)
 
     def clear_play_dots(self):
-        # Clear dots created during playback
-        for dot in self.play_dots:
-            self.canvas.delete(dot)
-        self.play_dots = []
+        # Clear dots created during playback, and the paths of compared models
+        self.play_layer.clear()
+        for layer in self.compare_layers:
+            layer.clear()
+        self.compare_layers = []
+        self.play_dots = Trajectory()
+
+    def stop_playback(self):
+        if self.playback is not None:
+            self.playback.cancel()
+            self.playback = None
 
     def remove_last(self):
         # Remove all recorded points from the canvas
-        self.canvas.delete("dot")
+        self.dots.clear()
+        self.canvas.delete("selection")
+        self.selection = []
 
         # Clear the recorded coordinates list
-        self.coordinates = []
+        self.recorder.remove_last()
 
         # Clear the recorded text
-        self.text_entry.delete(1.0, tk.END)
+        self.recorded_text.reset()
 
-        # Clear dots created during playback
+        # Stop any playback and clear the dots it created
+        self.stop_playback()
         self.clear_play_dots()
 
     def clear_samples(self):
-        # Functionality to clear recorded samples
-        pass
+        # Empty the sample library after confirmation
+        if not len(self.writer):
+            return
+        if messagebox.askyesno("Clear Samples", f"Delete all {len(self.writer)} recorded samples?"):
+            if self.training is not None:
+                self.train_model()  # Cancel training on the samples being removed
+            self.recorder.clear_samples()
+            if self.features is not None:
+                self.features.clear()
+            if self.similarity is not None:
+                self.similarity.clear()
+            self.label.config(text="Sample library cleared. Click on A to start recording.")
+
+    def export_samples(self):
+        # Stream the sample library to a JSON or NDJSON file, optionally compressed;
+        # a long session that is not in the library is added with the id "session"
+        path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("NDJSON", "*.ndjson"), ("Compressed", "*.gz *.zst"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            self.writer.flush()
+            samples = store_samples(self.samples)
+            session = self.recorder.session()
+            if session is not None:
+                samples = itertools.chain(samples, [("session", session)])
+            written = export(path, samples)
+        except (ExportError, SampleStoreError, SessionLogError, OSError) as error:
+            messagebox.showerror("Export", str(error))
+            return
+        self.label.config(text=f"Exported {written} samples to {path}.")
 
     def train_model(self):
-        # Functionality to train the model
-        pass
+        # Pressing Train Model again while training runs cancels it
+        if self.training is not None:
+            self.training.cancel()
+            self.training = None
+            self.train_button.config(text="Train Model")
+            self.label.config(text="Training cancelled.")
+            return
+        if not len(self.writer):
+            self.label.config(text="Record some samples before training.")
+            return
+        self.writer.flush()  # Train on every queued pass too
+
+        # Fit the model on a process pool; only samples added since the last run
+        # have their features extracted
+        self.training = self.training_module.TrainingJob(self.samples, self.features,
+                                                         augment=self.augment_copies, seed=self.augment_seed)
+        self.training.start()
+        self.train_button.config(text="Cancel Training")
+        self.poll_training()
+
+    def poll_training(self):
+        if self.training is None:
+            return
+        if not self.training.poll():
+            self.label.config(text=self.training.progress())
+            self.master.after(100, self.poll_training)
+            return
+
+        job = self.training
+        self.training = None
+        self.train_button.config(text="Train Model")
+        if job.error is not None:
+            self.label.config(text=f"Training failed: {job.error}")
+        elif job.model is not None:
+            self.model = job.model
+            real = job.model["samples"] - job.model["augmented"]
+            self.label.config(text=f"Trained on {real} samples and {job.model['augmented']} augmented copies.")
 
     def save_model(self):
-        # Functionality to save the model
-        pass
+        if self.model is None:
+            self.label.config(text="Train or load a model before saving it.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".ksbm", filetypes=[("Models", "*.ksbm"), ("All files", "*")])
+        if not path:
+            return
+        try:
+            self.model_file.save(path, self.model)
+        except OSError as error:
+            messagebox.showerror("Save Model", str(error))
+            return
+        self.label.config(text=f"Saved model to {path}.")
 
     def load_model(self):
-        # Functionality to load a model
-        pass
+        # Several files can be picked; Test then compares all loaded models and
+        # generates with the last one by default
+        paths = filedialog.askopenfilenames(filetypes=[("Models", "*.ksbm"), ("All files", "*")])
+        loaded = []
+        for path in paths:
+            try:
+                model = self.model_file.load(path)
+            except (self.model_file.ModelFileError, OSError) as error:
+                messagebox.showerror("Load Model", str(error))
+                continue
+            path = os.path.abspath(path)
+            self.models[path] = model
+            self.model = model
+            loaded.append(path)
+        if loaded:
+            names = ", ".join(self.model_name(path) for path in loaded)
+            self.label.config(text=f"Loaded {names} ({len(self.models)} models loaded).")
+
+    def model_name(self, path):
+        # A loaded model's file name, or its whole path if another loaded model
+        # has the same file name
+        name = os.path.splitext(os.path.basename(path))[0]
+        if any(other != path and os.path.basename(other) == os.path.basename(path) for other in self.models):
+            return path
+        return name
 
     def test(self):
-        # Functionality to test the model
-        pass
+        # Preview a path generated from A to B by the current model (or the
+        # generator's defaults when nothing has been trained yet). With several
+        # models loaded, the others' paths are drawn alongside in other colours.
+        self.stop_playback()
+        self.clear_play_dots()
+        models = self.test_models()
+        (name, model), others = models[0], models[1:]
+        path = self.synthesis.generate_trajectory((0.0, 0.0), (FRAME_LENGTH, 0.0), model)
+        self.playback = Playback(self.master, path, self.display_play_dot)
+        self.playback.start()
+        for k, (_, other) in enumerate(others):
+            layer = DotLayer(self.canvas, tag=f"compare_dot_{k}", fill=COMPARE_COLORS[k % len(COMPARE_COLORS)])
+            layer.frame = self.frame
+            layer.redraw(self.synthesis.generate_trajectory((0.0, 0.0), (FRAME_LENGTH, 0.0), other))
+            self.compare_layers.append(layer)
+
+        # How far each model's paths are from the closest recorded samples. The
+        # library is indexed on a background thread; until it is done the scores
+        # only cover part of it.
+        try:
+            self.similarity.start_sync(self.samples)
+        except (SampleStoreError, OSError) as error:
+            self.label.config(text=f"Previewing a path from {name}. Could not index the library: {error}")
+            return
+        if not len(self.similarity):
+            indexing = " Indexing the library..." if self.similarity.syncing() else ""
+            self.label.config(text=f"Previewing a path from {name}.{indexing}")
+            return
+        scores = []
+        for model_name, other in models:
+            x, y, t = self.synthesis.generate((0.0, 0.0), (FRAME_LENGTH, 0.0), COMPARE_PATHS, other)
+            distances = [self.similarity.nearest((x[i], y[i], t[i]), k=1, metric=self.similarity_metric)[0][1]
+                         for i in range(COMPARE_PATHS)]
+            scores.append(f"{model_name} {sum(distances) / COMPARE_PATHS:.3g}")
+        partial = f" ({len(self.similarity)} samples indexed so far)" if self.similarity.syncing() else ""
+        self.label.config(text=f"Previewing a path from {name}. Mean {self.similarity_metric} distance to the library{partial}: {', '.join(scores)}.")
+
+    def test_models(self):
+        # (name, model) pairs to test, the current model first
+        models = [(self.model_name(path), model) for path, model in self.models.items() if model is not self.model]
+        if self.model is None:
+            current = "untrained defaults"
+        else:
+            current = next((self.model_name(path) for path, model in self.models.items() if model is self.model), "trained model")
+        return [(current, self.model)] + models
+
+    def button_center(self, button):
+        # Centre of the A or B button in canvas coordinates
+        return (button.winfo_x() + button.winfo_width() / 2,
+                button.winfo_y() + button.winfo_height() / 2)
+
+    def select_point(self, event):
+        # Pick up the recorded point under the pointer, or start a box selection
+        if self.recording or not self.coordinates or self.dots.trajectory is not self.coordinates:
+            return
+        self.point_index.sync(self.coordinates)
+        x, y = self.local(event.x, event.y)
+        self.drag_index = self.point_index.nearest(x, y, HIT_RADIUS * self.frame_scale())
+        if self.drag_index is None:
+            self.box_start = (event.x, event.y)
+            self.canvas.delete("selection")
+            self.canvas.create_rectangle(event.x, event.y, event.x, event.y, outline="blue", dash=(2, 2), tags="selection")
 
     def move_point_start(self, event):
-        if self.recording:
-            if event.widget.find_withtag(tk.CURRENT):
-                self.dragging = True
+        if self.drag_index is not None:
+            # Move the point in place; only the canvas item drawing it is refreshed
+            self.dragging = True
+            self.point_index.move(self.drag_index, *self.local(event.x, event.y))
+            self.dots.move_point(self.drag_index)
+        elif self.box_start is not None:
+            self.canvas.coords("selection", *self.box_start, event.x, event.y)
 
     def move_point_end(self, event):
+        if self.drag_index is not None and self.dragging:
+            # The text pane only ever appends, so render it again for the edited point
+            self.recorded_text.reset()
+            self.update_recorded_text()
+            self.store_edit()
+        elif self.box_start is not None:
+            self.selection = self.select_box(*self.box_start, event.x, event.y)
+            self.label.config(text=f"{len(self.selection)} points selected.")
         self.dragging = False
+        self.drag_index = None
+        self.box_start = None
+
+    def store_edit(self):
+        # Replace the pass in the sample library with its edited points, so Export,
+        # Train and Test use them
+        try:
+            sample_id = self.recorder.store_edit()
+        except (SampleStoreError, OSError) as error:
+            messagebox.showerror("Sample library", f"Could not save the edited sample: {error}")
+            return
+        if sample_id is None:
+            self.label.config(text="Moved the point; it is not part of a stored sample.")
+            return
+        columns = self.coordinates.columns()
+        if self.features is not None:
+            self.features.update(sample_id, columns)
+        if self.similarity is not None:
+            self.similarity.replace(sample_id, columns)
+        self.label.config(text=f"Updated sample {sample_id} in the library.")
+
+    def select_box(self, x1, y1, x2, y2):
+        # Points inside a box drawn on the canvas. The box is generally rotated in
+        # the A->B frame, so query its bounding box there and keep the points that
+        # are inside on the canvas.
+        corners = [self.local(x, y) for x in (x1, x2) for y in (y1, y2)]
+        xs = [x for x, _ in corners]
+        ys = [y for _, y in corners]
+        found = self.point_index.in_box(min(xs), min(ys), max(xs), max(ys))
+        if self.frame is None:
+            return found
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        px, py = self.coordinates.x, self.coordinates.y
+        inside = []
+        for i in found:
+            x, y = self.frame.to_canvas(px[i], py[i])
+            if x1 <= x <= x2 and y1 <= y <= y2:
+                inside.append(i)
+        return inside
+
+    def local(self, x, y):
+        # Canvas position in the frame the coordinates are recorded in
+        return (x, y) if self.frame is None else self.frame.to_local(x, y)
+
+    def frame_scale(self):
+        return 1.0 if self.frame is None else self.frame.scale
+
+    def place_buttons(self):
+        self.a_button.place(x=0, y=0, relx=self.a_x_cm, rely=self.a_y, anchor="center")
+        self.b_button.place(x=0, y=0, relx=self.b_x, rely=self.b_y, anchor="center")
+
+    def update_frame(self, width, height):
+        # Rebuild the canvas <-> A->B frame map for the current layout, then redraw
+        # the paths through it in one go so they line up with A and B again
+        a = (self.a_x_cm * width, self.a_y * height)
+        b = (self.b_x * width, self.b_y * height)
+        self.frame = EndpointFrame(a, b)
+        self.recorder.frame = self.frame
+        self.dots.frame = self.frame
+        self.play_layer.frame = self.frame
+        self.dots.redraw(self.dots.trajectory)
+        self.play_layer.redraw(self.play_layer.trajectory)
+        for layer in self.compare_layers:
+            layer.frame = self.frame
+            layer.redraw(layer.trajectory)
+        if self.selection:
+            self.canvas.delete("selection")
 
     def on_canvas_resize(self, event):
-        # Update positions of A and B when canvas is resized
-        self.a_button.place(relx=self.a_x_cm, rely=self.a_y, anchor="center")
-        self.b_button.place(relx=self.b_x, rely=self.b_y, anchor="center")
+        # Update positions of A and B when canvas is resized, and the frame with them
+        self.canvas_size = (event.width, event.height)
+        self.place_buttons()
+        self.update_frame(event.width, event.height)
+
+    def on_first_paint(self, event):
+        if self.first_paint_ms is not None:
+            return
+        self.first_paint_ms = (time.perf_counter() - min(process_started(), IMPORTED)) * 1000
+        if self.profiler is not None:
+            self.profiler.gauge("first_paint_ms", self.first_paint_ms)
+        self.backends.start()
+
+    def training_ready(self, features, training, model_file):
+        self.features = features.FeatureCache()
+        self.training_module = training
+        self.model_file = model_file
+        for button in (self.train_button, self.save_button, self.load_button):
+            button.config(state=tk.NORMAL)
+
+    def test_ready(self, synthesis, similarity):
+        self.synthesis = synthesis
+        self.similarity = similarity.SimilarityIndex()
+        self.similarity.start_sync(self.samples)
+        self.test_button.config(state=tk.NORMAL)
+
+    def backends_failed(self, errors):
+        names = ", ".join(sorted(errors))
+        self.label.config(text=f"Could not load {names}: {next(iter(errors.values()))}")
+
+    def gauges(self):
+        # Sizes that tend to grow when the app starts lagging
+        gauges = {
+            "canvas_items": len(self.canvas.find_all()),
+            "after_timers": len(self.master.tk.splitlist(self.master.tk.call("after", "info"))),
+            "trajectory_bytes": self.coordinates.memory_usage(),
+            "points": len(self.coordinates),
+            "points_on_disk": self.coordinates.offset,
+            "write_queue": self.writer.pending,
+        }
+        sampler = self.recorder.sampler
+        if sampler is not None:
+            # Samples lost to a full ring buffer, and the histograms of the current
+            # (or last) pass: how late the sampler woke up, and how old the
+            # position it sampled was
+            gauges["sampler_dropped"] = sampler.buffer.dropped
+            for name, histogram in (("jitter", sampler.jitter), ("age", sampler.age)):
+                summary = histogram.summary()
+                gauges[f"sampler_{name}_mean_us"] = round(summary["mean_us"], 1)
+                gauges[f"sampler_{name}_p99_us"] = summary["p99_us"]
+                gauges[f"sampler_{name}_max_us"] = round(summary["max_us"], 1)
+                for edge, count in summary["buckets_us"].items():
+                    gauges[f"sampler_{name}_le_{edge}_us"] = count
+        return gauges
+
+    def close(self):
+        # Stop training and playback, and write the passes still queued before the
+        # process exits. Cancelling the job shuts its pool down and unlinks the
+        # shared memory of the feature matrix.
+        if self.training is not None:
+            self.training.cancel()
+            self.training = None
+        self.stop_playback()
+        if self.stats is not None:
+            self.stats.stop()
+            self.profiler.stop()
+        self.writer.close()
+        if self.similarity is not None:
+            self.similarity.close()
+        self.samples.close()
+        if self.session_log is not None:
+            self.session_log.close()
+
+def check_startup(app, budget):
+    # Runs once the first events are handled; waits for the first paint if needed
+    if app.first_paint_ms is None:
+        app.master.after(10, check_startup, app, budget)
+    elif app.first_paint_ms > budget:
+        print(f"first paint took {app.first_paint_ms:.0f} ms, over the {budget:.0f} ms budget", file=sys.stderr)
 
 def main():
+    parser = argparse.ArgumentParser(description="Record A->B pointer paths.")
+    parser.add_argument("--sample-rate", type=int, default=0, metavar="HZ", help="sample the pointer at a fixed rate on a background thread (default: record <Motion> events)")
+    parser.add_argument("--augment-seed", type=int, default=AUGMENT_SEED, metavar="N", help="seed of the augmented training copies (default %(default)s)")
+    parser.add_argument("--session-tail", type=int, default=TAIL_POINTS, metavar="POINTS", help="points a long session keeps in memory and on the canvas (default %(default)s)")
+    parser.add_argument("--stats", action="store_true", help="time callbacks and event loop lag (F2 shows them)")
+    parser.add_argument("--profile", metavar="PATH", help="write callback timings and gauges as JSON on exit")
+    parser.add_argument("--trace", metavar="PATH", help="write a Chrome trace of callbacks and gauges on exit")
+    parser.add_argument("--startup-budget", type=float, metavar="MS", help="warn if the first paint takes longer than this")
+    parser.add_argument("--log-events", metavar="PATH", help="log the Tk event stream for event_replay.py (NDJSON, .gz to compress)")
+    args = parser.parse_args()
+    if args.session_tail < 1:
+        parser.error("--session-tail must be at least 1")
+
+    profiler = None
+    if args.stats or args.profile or args.trace:
+        from instrumentation import Profiler
+        profiler = Profiler()
+
     root = tk.Tk()
     root.geometry("1400x600")  # Initial window size
-    app = DrawingApp(root)
+    app = DrawingApp(root, sample_rate=args.sample_rate, profiler=profiler, augment_seed=args.augment_seed,
+                     session_tail=args.session_tail)
+    event_log = None
+    if args.log_events:
+        from event_replay import EventLog
+        event_log = EventLog(app, args.log_events)
+    if args.startup_budget is not None:
+        root.after_idle(check_startup, app, args.startup_budget)
     root.mainloop()
+    app.close()
+    if event_log is not None:
+        event_log.close()
+    if args.profile:
+        profiler.dump(args.profile)
+    if args.trace:
+        profiler.dump(args.trace, "chrome")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,130 @@
+import time
+from bisect import bisect_left, bisect_right
+
+from recorded_text import FRAME_MS
+
+# Points drawn per frame when playing back as fast as possible
+FAST_BATCH = 2000
+
+EMPTY = ((), (), ())
+
+
+class Playback:
+    # Replays a Trajectory using one timer per display frame. Each tick hands every
+    # point that became due since the previous tick to on_point(x, y), instead of
+    # scheduling one `after` callback per point up front.
+    #
+    # speed is the playback rate relative to the recorded timeline (1.0 is real
+    # time, 2.0 twice as fast); None plays back as fast as the UI can draw.
+    #
+    # The trajectory is read a piece at a time through its chunks(), so a long
+    # session streamed back from disk is never all in memory.
+
+    def __init__(self, widget, trajectory, on_point, speed=1.0, on_finish=None):
+        self.widget = widget
+        self.trajectory = trajectory
+        self.on_point = on_point
+        self.on_finish = on_finish
+        self.speed = speed
+
+        # Columns of the current piece, index of the next point in it to hand
+        # out, and playhead in recorded ms
+        self.pieces = trajectory.chunks()
+        self.x, self.y, self.t = EMPTY
+        self.index = 0
+        self.next_piece()
+        self.position = self.t[0] if len(self.t) else 0.0
+
+        # Wall-clock time at which the playhead was last anchored
+        self.anchor = None
+        self.timer = None
+        self.paused = False
+        self.finished = False
+
+    def start(self):
+        self.paused = False
+        self.anchor = time.perf_counter()
+        self.schedule()
+
+    def pause(self):
+        if self.paused or self.finished:
+            return
+        self.advance_position()
+        self.paused = True
+        self.unschedule()
+
+    def resume(self):
+        if self.paused and not self.finished:
+            self.start()
+
+    def cancel(self):
+        self.unschedule()
+        self.finished = True
+
+    def seek(self, t_ms):
+        # Move the playhead; points before it count as already shown, and the
+        # caller is responsible for redrawing them if it wants them on screen
+        self.position = t_ms
+        self.pieces = self.trajectory.chunks()
+        self.x, self.y, self.t = EMPTY
+        while self.next_piece() and self.t[-1] < t_ms:
+            pass
+        self.index = bisect_left(self.t, t_ms)
+        self.anchor = time.perf_counter()
+        if self.finished and self.index < len(self.t):
+            self.finished = False
+            if not self.paused:
+                self.schedule()
+
+    def next_piece(self):
+        # Move on to the next non-empty piece; False at the end of the trajectory
+        for piece in self.pieces:
+            if len(piece[0]):
+                self.x, self.y, self.t = piece
+                self.index = 0
+                return True
+        return False
+
+    def advance_position(self):
+        now = time.perf_counter()
+        if self.speed is not None and self.anchor is not None:
+            self.position += (now - self.anchor) * 1000 * self.speed
+        self.anchor = now
+
+    def schedule(self):
+        if self.timer is None:
+            self.timer = self.widget.after(FRAME_MS if self.speed is not None else 1, self.tick)
+
+    def unschedule(self):
+        if self.timer is not None:
+            self.widget.after_cancel(self.timer)
+            self.timer = None
+
+    def tick(self):
+        self.timer = None
+        if self.speed is not None:
+            self.advance_position()
+        budget = FAST_BATCH
+        while True:
+            count = len(self.t)
+            if self.speed is None:
+                stop = min(count, self.index + budget)
+                budget -= stop - self.index
+            else:
+                stop = bisect_right(self.t, self.position, self.index)
+
+            x, y, on_point = self.x, self.y, self.on_point
+            for i in range(self.index, stop):
+                on_point(x[i], y[i])
+            self.index = stop
+
+            # Carry on into the next piece if this one is done
+            if stop < count or not self.next_piece():
+                break
+
+        if self.index >= len(self.t):
+            self.finished = True
+            if self.on_finish is not None:
+                self.on_finish()
+        else:
+            self.schedule()
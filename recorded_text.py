@@ -0,0 +1,163 @@
+import tkinter as tk
+
+from recorder import endpoint_block, point_block
+from trajectory import Trajectory
+
+# Delay between batched writes into the Text widget (about one frame at 60 fps)
+FRAME_MS = 16
+
+# Interior points shown at the start and at the end of the preview; the ones in
+# between are left out (use Export to get all of them)
+PREVIEW_POINTS = 50
+
+
+def omitted_line(count):
+    return f"    ... {count} more points ...\n"
+
+
+class RecordedText:
+    # Keeps the recorded-text pane in sync with a Trajectory by appending
+    # only the points that are new since the last flush and patching the "B" block
+    # in place, instead of rebuilding the whole widget on every sample.
+    #
+    # The pane is a bounded preview: once there are more than 2 * preview interior
+    # points, only the first and last `preview` are shown, so the widget never
+    # holds more than a fixed amount of text however long the recording gets.
+    # Points are counted from the start of the recording, so the head stays in
+    # place when a long session spills the oldest coordinates to disk; a full
+    # render reads A and the head back from the session's `log`.
+
+    def __init__(self, text_widget, preview=PREVIEW_POINTS):
+        self.text = text_widget
+        self.preview = preview
+        self.coordinates = Trajectory()
+
+        # SessionLog holding the points a long session spilled, if any
+        self.log = None
+
+        # Whether the middle of the points list is left out
+        self.omitting = False
+
+        # Number of points of the recording currently reflected in the widget
+        self.rendered = 0
+
+        # Id of the scheduled flush, so all updates of one frame share a single write
+        self.flush_pending = None
+
+    def update(self, coordinates):
+        self.coordinates = coordinates
+        if self.flush_pending is None:
+            self.flush_pending = self.text.after(FRAME_MS, self.flush)
+
+    def reset(self):
+        # Drop everything rendered so far, e.g. when a new recording starts
+        if self.flush_pending is not None:
+            self.text.after_cancel(self.flush_pending)
+            self.flush_pending = None
+        self.coordinates = Trajectory()
+        self.rendered = 0
+        self.omitting = False
+        self.text.delete(1.0, tk.END)
+
+    def flush(self):
+        self.flush_pending = None
+        coordinates = self.coordinates
+        count = coordinates.offset + len(coordinates)
+
+        if count < self.rendered:
+            # The list shrank underneath us, start over
+            self.rendered = 0
+        if count == 0:
+            if self.rendered == 0:
+                self.text.delete(1.0, tk.END)
+            return
+        if count == self.rendered:
+            return
+
+        if self.rendered == 0:
+            self.render_all(coordinates)
+        else:
+            self.render_new(coordinates)
+        self.rendered = count
+
+    def render_all(self, coordinates):
+        count = coordinates.offset + len(coordinates)
+        first = self.log.point(0) if coordinates.offset else coordinates[0]
+        last = coordinates[-1]
+        chunks = [endpoint_block("A", first["x"], first["y"], 0),
+                  endpoint_block("B", last["x"], last["y"], last["t"]),
+                  '"points": [\n']
+        interior = max(0, count - 2)
+        self.omitting = interior > 2 * self.preview
+        if self.omitting:
+            chunks.extend(self.point_blocks(1, 1 + self.preview))
+            chunks.append(omitted_line(interior - 2 * self.preview))
+            chunks.extend(self.point_blocks(count - 1 - self.preview, count - 1))
+            lines = 5 * 2 * self.preview + 1
+        else:
+            chunks.extend(self.point_blocks(1, count - 1))
+            lines = 5 * interior
+        chunks.append('],\n')
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, "".join(chunks))
+
+        # The A block is 5 lines, the B block the next 5, then the "points" header
+        # and 5 lines per shown interior point. Marks let later flushes find the
+        # regions again even if text is typed elsewhere in the widget.
+        points_end = 12 + lines
+        self.text.mark_set("b_start", "6.0")
+        self.text.mark_gravity("b_start", tk.LEFT)
+        self.text.mark_set("b_end", "11.0")
+        self.text.mark_gravity("b_end", tk.RIGHT)
+        self.text.mark_set("points_end", f"{points_end}.0")
+        self.text.mark_gravity("points_end", tk.RIGHT)
+        if self.omitting:
+            self.set_head_end()
+
+    def set_head_end(self):
+        # End of the first `preview` points, where the left-out part starts
+        self.text.mark_set("head_end", f"{12 + 5 * self.preview}.0")
+        self.text.mark_gravity("head_end", tk.LEFT)
+
+    def point_blocks(self, start, stop):
+        # Blocks of the points from start to stop of the recording; points spilled
+        # to disk are read back from the log
+        offset = self.coordinates.offset
+        if start < offset:
+            yield from self.logged_blocks(start, min(stop, offset))
+        columns = self.coordinates.columns(max(0, start - offset), max(0, stop - offset))
+        yield from (point_block(x, y, t) for x, y, t in zip(*columns))
+
+    def logged_blocks(self, start, stop):
+        index = 0
+        for xs, ys, ts in self.log.chunks():
+            if index >= stop:
+                break
+            low, high = max(0, start - index), min(len(xs), stop - index)
+            yield from (point_block(x, y, t) for x, y, t in zip(xs[low:high], ys[low:high], ts[low:high]))
+            index += len(xs)
+
+    def render_new(self, coordinates):
+        count = coordinates.offset + len(coordinates)
+        interior = count - 2
+        if interior > 2 * self.preview:
+            # Rewrite the count of left-out points and the tail; both are bounded
+            if not self.omitting:
+                # Complete the head first if fewer points were shown so far
+                start = max(1, self.rendered - 1)
+                if start < 1 + self.preview:
+                    self.text.insert("points_end", "".join(self.point_blocks(start, 1 + self.preview)))
+                self.omitting = True
+                self.set_head_end()
+            self.text.delete("head_end", "points_end")
+            tail = self.point_blocks(count - 1 - self.preview, count - 1)
+            self.text.insert("head_end", omitted_line(interior - 2 * self.preview) + "".join(tail))
+        else:
+            # Points that moved from the "B" slot (or were just recorded) into the interior
+            start = max(1, self.rendered - 1)
+            if start < count - 1:
+                self.text.insert("points_end", "".join(self.point_blocks(start, count - 1)))
+
+        last = coordinates[-1]
+        self.text.delete("b_start", "b_end")
+        self.text.insert("b_start", endpoint_block("B", last["x"], last["y"], last["t"]))
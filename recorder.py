@@ -0,0 +1,198 @@
+import time
+from array import array
+
+from session_log import Session
+from trajectory import Trajectory
+
+
+def format_number(value):
+    # Samples are stored as floats; whole numbers are written without ".0" as before
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def endpoint_block(name, x, y, t):
+    # Text for the "A" or "B" block
+    x, y, t = format_number(x), format_number(y), format_number(t)
+    return f'"{name}": {{\n    "x": {x},\n    "y": {y},\n    "t": {t}\n}},\n'
+
+
+def point_block(x, y, t):
+    # Text for one entry of the "points" list
+    x, y, t = format_number(x), format_number(y), format_number(t)
+    return f'    {{\n        "x": {x},\n        "y": {y},\n        "t": {t}\n    }},\n'
+
+
+def recorded_text(trajectory):
+    # The whole recorded-text dump of a trajectory, as shown in the text pane
+    if not trajectory:
+        return ""
+    first = trajectory[0]
+    last = trajectory[-1]
+    chunks = [endpoint_block("A", first["x"], first["y"], 0),
+              endpoint_block("B", last["x"], last["y"], last["t"]),
+              '"points": [\n']
+    chunks.extend(point_block(x, y, t) for x, y, t in zip(*trajectory.columns(1, -1)))
+    chunks.append('],\n')
+    return "".join(chunks)
+
+
+class Recorder:
+    # The recording state machine without any Tk: starting and stopping an A->B
+    # pass, taking samples, and handing finished passes to the sample library.
+    # DrawingApp feeds it pointer positions and draws whatever it recorded.
+
+    def __init__(self, store=None, sampler=None, clock=time.perf_counter_ns, simplifier=None):
+        self.store = store
+        self.sampler = sampler
+        self.clock = clock
+
+        # Optional StreamingSimplifier between the samples and the coordinates;
+        # None records every sample (raw capture)
+        self.simplifier = simplifier
+
+        # EndpointFrame that pointer positions are mapped into before they are
+        # recorded; None keeps canvas pixels
+        self.frame = None
+
+        # Long-session mode: only the last `tail` points stay in the coordinates,
+        # older ones go to the SessionLog `log` a chunk at a time. None keeps the
+        # whole pass in memory.
+        self.tail = None
+        self.log = None
+
+        self.coordinates = Trajectory()
+        self.recording = False
+        self.start_time = 0
+
+        # Id of the last pass that was added to the store, while the coordinates
+        # are that pass
+        self.last_sample_id = None
+
+    def start(self):
+        self.recording = True
+        self.coordinates = Trajectory()
+        self.last_sample_id = None
+        if self.simplifier is not None:
+            self.simplifier.reset(self.coordinates)
+        if self.tail is not None:
+            self.log.clear()
+        self.start_time = self.clock()
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def stop(self):
+        # Finish the pass; returns its sample id if it was stored
+        self.recording = False
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.drain()
+        if self.simplifier is not None:
+            self.simplifier.flush()
+        if self.coordinates.offset:
+            # A spilled long session is not an A->B pass; it stays in the log
+            self.log.flush()
+            return None
+        if self.store is not None and self.coordinates:
+            self.last_sample_id = self.store.append(self.coordinates)
+            return self.last_sample_id
+        return None
+
+    def store_edit(self):
+        # The points of the last stored pass were edited: store them again under
+        # its id. Returns the id, or None if the points are not a stored pass.
+        if self.recording or self.last_sample_id is None or self.coordinates.offset:
+            return None
+        self.store.replace(self.last_sample_id, self.coordinates)
+        return self.last_sample_id
+
+    def toggle(self):
+        if self.recording:
+            return self.stop()
+        self.start()
+        return None
+
+    def pointer_moved(self, x, y):
+        # A new pointer position while over the recording area. Returns True if it
+        # was recorded right away (without a sampler).
+        if not self.recording:
+            return False
+        if self.sampler is not None:
+            if self.frame is not None:
+                x, y = self.frame.to_local(x, y)
+            self.sampler.set_position(x, y)
+            return False
+        return self.add_sample(x, y)
+
+    def pointer_left(self):
+        # The pointer left the recording area (or went over a button)
+        if self.sampler is not None:
+            self.sampler.clear_position()
+
+    def add_sample(self, x, y, now=None):
+        if not self.recording:
+            return False
+        if now is None:
+            now = self.clock()
+        if self.frame is not None:
+            x, y = self.frame.to_local(x, y)
+        self.sink().append(x, y, (now - self.start_time) // 1000000)  # ms since recording started
+        self.spill()
+        return True
+
+    def drain(self):
+        # Move the sampler's pending samples into the coordinates; returns how many
+        if self.sampler is None:
+            return 0
+        added = self.sampler.drain_into(self.sink(), self.start_time)
+        self.spill()
+        return added
+
+    def spill(self):
+        # In a long session, hand whole chunks beyond the tail to the log
+        if self.tail is None:
+            return
+        chunk = self.log.chunk
+        count = (len(self.coordinates) - self.tail) // chunk * chunk
+        if count <= 0:
+            return
+        for start in range(0, count, chunk):
+            self.log.append(*(array('d', column) for column in self.coordinates.columns(start, start + chunk)))
+        self.coordinates.drop_front(count)
+
+    def session(self):
+        # The whole current pass if part of it was spilled, else None
+        if not self.coordinates.offset:
+            return None
+        return Session(self.log, self.coordinates)
+
+    def sink(self):
+        # Where new samples go: straight into the coordinates, or through the simplifier
+        return self.coordinates if self.simplifier is None else self.simplifier
+
+    def compression(self):
+        # Fraction of the samples of the current pass that were kept, or None in raw capture
+        if self.simplifier is None:
+            return None
+        return self.simplifier.ratio()
+
+    def remove_last(self):
+        # Throw the current points away; a pass being recorded carries on
+        self.coordinates = Trajectory()
+        self.last_sample_id = None
+        if self.simplifier is not None:
+            self.simplifier.reset(self.coordinates)
+        if self.tail is not None:
+            self.log.clear()  # The spilled points were part of what is thrown away
+
+    def clear_samples(self):
+        self.last_sample_id = None
+        if self.store is not None:
+            self.store.clear()
+
+    def record(self):
+        return self.coordinates.record()
+
+    def text(self):
+        return recorded_text(self.coordinates)
@@ -0,0 +1,288 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from trajectory import Trajectory
+
+# File layout:
+#   header   MAGIC, version
+#   records  u32 payload length, then payload: u32 sample id, u32 point count,
+#            then x, y and t as float32 columns of `count` values each
+#   index    after every batch of records, a segment with their entries, stored
+#            like a record: u32 length, INDEX_ID, u32 entries, u64 offset of the
+#            previous segment (0 for none), then per sample: u32 id, u64 record
+#            offset, u32 point count
+#   trailer  u64 offset of the last index segment, u32 samples, INDEX_MAGIC
+# New records overwrite only the trailer, so appending costs the size of what is
+# appended, not of the library.
+MAGIC = b"KSBS"
+INDEX_MAGIC = b"KSBI"
+VERSION = 2
+
+# Sample id field of an index segment
+INDEX_ID = 0xFFFFFFFF
+
+HEADER = struct.Struct("<4sI")
+RECORD_LENGTH = struct.Struct("<I")
+RECORD_HEADER = struct.Struct("<II")
+SEGMENT_HEADER = struct.Struct("<IIQ")
+INDEX_ENTRY = struct.Struct("<IQI")
+TRAILER = struct.Struct("<QI4s")
+
+
+class SampleStoreError(Exception):
+    pass
+
+
+class SampleStore:
+    # Library of finished A->B recordings in a compact binary file. The file is
+    # memory-mapped and only the index is parsed on open, so a single sample can be
+    # read by id without touching the rest of the file. All methods may be called
+    # from more than one thread (e.g. a SampleWriter appending in the background).
+
+    def __init__(self, path, readonly=False):
+        # A read-only store never writes to the file, so other processes can open
+        # the library while the app keeps appending to it
+        self.path = path
+        self.readonly = readonly
+        if not readonly and (not os.path.exists(path) or os.path.getsize(path) == 0):
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION))
+                f.write(TRAILER.pack(0, 0, INDEX_MAGIC))
+
+        try:
+            self.file = open(path, "rb" if readonly else "r+b")
+        except FileNotFoundError:
+            raise SampleStoreError(f"{path} does not exist") from None
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise SampleStoreError(f"{path} is not a sample library")
+        self.map = None
+        self.lock = threading.RLock()
+
+        # Sample id -> (record offset, point count), in insertion order; the
+        # largest id; where the trailer (and so the next record) starts; and the
+        # offset of the last index segment
+        self.index = {}
+        self.top_id = 0
+        self.end = HEADER.size
+        self.segment = 0
+        self.reload()
+
+    def reload(self):
+        # Map the file and read its index
+        self.remap()
+        magic, version = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise SampleStoreError(f"{self.path} is not a sample library")
+        if version != VERSION:
+            raise SampleStoreError(f"{self.path} has unsupported version {version}")
+
+        size = len(self.map)
+        if size >= HEADER.size + TRAILER.size:
+            offset, entries, magic = TRAILER.unpack_from(self.map, size - TRAILER.size)
+            if magic == INDEX_MAGIC and self.read_segments(offset, size - TRAILER.size):
+                self.end = size - TRAILER.size
+                return
+
+        # The trailer is missing or damaged (e.g. the app died while appending):
+        # walk the length-prefixed records and rebuild the index from them
+        self.rebuild_index()
+
+    def remap(self):
+        self.release_map()
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read_entries(self, offset, entries):
+        for i in range(entries):
+            sample_id, record, count = INDEX_ENTRY.unpack_from(self.map, offset + i * INDEX_ENTRY.size)
+            self.add_entry(sample_id, record, count)
+
+    def read_segments(self, segment, end):
+        # Follow the chain of index segments back from the last one; False if it
+        # is broken
+        segments = []
+        last = segment
+        while segment:
+            if segment < HEADER.size or segment + RECORD_LENGTH.size + SEGMENT_HEADER.size > end:
+                return False
+            (length,) = RECORD_LENGTH.unpack_from(self.map, segment)
+            marker, entries, previous = SEGMENT_HEADER.unpack_from(self.map, segment + RECORD_LENGTH.size)
+            if marker != INDEX_ID or length != SEGMENT_HEADER.size + entries * INDEX_ENTRY.size \
+                    or segment + RECORD_LENGTH.size + length > end or previous >= segment:
+                return False
+            segments.append((segment + RECORD_LENGTH.size + SEGMENT_HEADER.size, entries))
+            segment = previous
+        self.index = {}
+        self.top_id = 0
+        for offset, entries in reversed(segments):
+            self.read_entries(offset, entries)
+        self.segment = last
+        return True
+
+    def add_entry(self, sample_id, offset, count):
+        self.index[sample_id] = (offset, count)
+        self.top_id = max(self.top_id, sample_id)
+
+    def rebuild_index(self):
+        self.index = {}
+        self.top_id = 0
+        offset = HEADER.size
+        end = len(self.map)
+        while offset + RECORD_LENGTH.size + RECORD_HEADER.size <= end:
+            (length,) = RECORD_LENGTH.unpack_from(self.map, offset)
+            if length < RECORD_HEADER.size or offset + RECORD_LENGTH.size + length > end:
+                break
+            sample_id, count = RECORD_HEADER.unpack_from(self.map, offset + RECORD_LENGTH.size)
+            if sample_id == INDEX_ID:
+                # An index segment; the records it lists are found on the way
+                if SEGMENT_HEADER.size + INDEX_ENTRY.size * count != length:
+                    break
+            elif RECORD_HEADER.size + 12 * count != length:
+                break
+            else:
+                self.add_entry(sample_id, offset, count)
+            offset += RECORD_LENGTH.size + length
+        self.end = offset
+        if not self.readonly:
+            self.write_index()
+
+    def check_writable(self):
+        if self.readonly:
+            raise SampleStoreError(f"{self.path} is open read-only")
+
+    def write_index(self):
+        # Write the whole index as a single segment at the end of the records and
+        # drop anything after it
+        self.check_writable()
+
+        # Unmap first: some platforms refuse to truncate a mapped file
+        self.release_map()
+        self.segment = 0
+        self.file.seek(self.end)
+        self.file.write(self.index_segment(self.index.items(), len(self.index)))
+        self.file.truncate()
+        self.file.flush()
+        self.remap()
+
+    def index_segment(self, entries, samples):
+        # An index segment for the (sample_id, (offset, count)) entries, written at
+        # self.end and linked to the previous one, followed by the trailer for a
+        # library of `samples` samples
+        entries = [INDEX_ENTRY.pack(sample_id, offset, count) for sample_id, (offset, count) in entries]
+        length = SEGMENT_HEADER.size + INDEX_ENTRY.size * len(entries)
+        segment = self.end
+        chunks = [RECORD_LENGTH.pack(length), SEGMENT_HEADER.pack(INDEX_ID, len(entries), self.segment)]
+        chunks.extend(entries)
+        self.segment = segment
+        self.end = segment + RECORD_LENGTH.size + length
+        chunks.append(TRAILER.pack(segment, samples, INDEX_MAGIC))
+        return b"".join(chunks)
+
+    def __len__(self):
+        with self.lock:
+            return len(self.index)
+
+    def __contains__(self, sample_id):
+        with self.lock:
+            return sample_id in self.index
+
+    def ids(self):
+        with self.lock:
+            return list(self.index)
+
+    def next_id(self):
+        with self.lock:
+            return self.top_id + 1
+
+    def append(self, trajectory, sample_id=None):
+        # Store a finished recording and return its sample id
+        return self.extend([(sample_id, trajectory)])[0]
+
+    def replace(self, sample_id, trajectory):
+        # Store a new version of a sample under the same id; the old record stays
+        # in the file but is no longer indexed
+        self.extend([(sample_id, trajectory)])
+
+    def extend(self, samples):
+        # Store several (sample_id or None, trajectory) pairs followed by one index
+        # segment listing them; returns their sample ids
+        self.check_writable()
+        with self.lock:
+            chunks = []
+            entries = []
+            top_id = self.top_id
+            offset = self.end
+            for sample_id, trajectory in samples:
+                if sample_id is None:
+                    sample_id = top_id + 1
+                elif sample_id == INDEX_ID:
+                    raise SampleStoreError(f"sample id {sample_id} is reserved")
+                top_id = max(top_id, sample_id)
+                x, y, t = trajectory.columns()
+                count = len(x)
+                payload = [RECORD_LENGTH.pack(RECORD_HEADER.size + 12 * count), RECORD_HEADER.pack(sample_id, count)]
+                for column in (x, y, t):
+                    payload.append(array('f', column).tobytes())
+                payload = b"".join(payload)
+                chunks.append(payload)
+                entries.append((sample_id, (offset, count)))
+                offset += len(payload)
+
+            # The records overwrite the old trailer; the new one follows their index
+            start, segment = self.end, self.segment
+            new_ids = {sample_id for sample_id, _ in entries}
+            samples = len(self.index) + sum(1 for sample_id in new_ids if sample_id not in self.index)
+            self.end = offset
+            chunks.append(self.index_segment(entries, samples))
+            try:
+                self.file.seek(start)
+                self.file.write(b"".join(chunks))
+                self.file.flush()
+            except OSError:
+                self.end, self.segment = start, segment
+                raise
+            for sample_id, (record, count) in entries:
+                self.add_entry(sample_id, record, count)
+            self.remap()
+            return [sample_id for sample_id, _ in entries]
+
+    def columns(self, sample_id):
+        # Zero-copy float32 views of a sample's x, y and t columns in the mapped file
+        with self.lock:
+            try:
+                offset, count = self.index[sample_id]
+            except KeyError:
+                raise KeyError(f"no sample with id {sample_id}") from None
+            start = offset + RECORD_LENGTH.size + RECORD_HEADER.size
+            view = memoryview(self.map)[start:start + 12 * count].cast('f')
+            return view[:count], view[count:2 * count], view[2 * count:]
+
+    def load(self, sample_id):
+        # A sample as a Trajectory (the columns are widened back to float64)
+        x, y, t = self.columns(sample_id)
+        return Trajectory(array('d', x), array('d', y), array('d', t))
+
+    def clear(self):
+        with self.lock:
+            self.index = {}
+            self.top_id = 0
+            self.end = HEADER.size
+            self.write_index()
+
+    def release_map(self):
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # Views from columns() are still alive; the old mapping stays valid
+                # for them and is closed once they are garbage collected
+                pass
+            self.map = None
+
+    def close(self):
+        with self.lock:
+            self.release_map()
+            self.file.close()
@@ -0,0 +1,113 @@
+import queue
+import threading
+from array import array
+
+from trajectory import Trajectory
+
+# Most queued samples written with one index update
+MAX_BATCH = 64
+
+
+class SampleWriter:
+    # Queue in front of a SampleStore: append() hands a finished pass to a
+    # background thread and returns its sample id at once, so the UI thread never
+    # waits for the disk. Passes that pile up while a write is running go to the
+    # store together with a single index update.
+
+    def __init__(self, store):
+        self.store = store
+        self.queue = queue.Queue()
+        self.next_id = store.next_id()
+
+        # Samples in the library once everything queued is written, kept here so
+        # that len() never waits for the store's lock while a write is running
+        self.count = len(store)
+
+        # Samples handed over but not written yet
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.written = threading.Condition(self.lock)
+
+        # First error raised in the writer thread; reported by the next call
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, name="sample-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, trajectory):
+        # Queue a copy of the trajectory (it may still be edited) and return its id
+        self.check_error()
+        copy = Trajectory(*(array('d', column) for column in trajectory.columns()))
+        with self.lock:
+            sample_id = self.next_id
+            self.next_id += 1
+            self.pending += 1
+            self.count += 1
+        self.queue.put((sample_id, copy, True))
+        return sample_id
+
+    def replace(self, sample_id, trajectory):
+        # Queue a new version of a sample that is already in the library
+        self.check_error()
+        copy = Trajectory(*(array('d', column) for column in trajectory.columns()))
+        with self.lock:
+            self.pending += 1
+        self.queue.put((sample_id, copy, False))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self.store.extend([(sample_id, copy) for sample_id, copy, _ in batch])
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+                with self.lock:
+                    self.count -= sum(added for _, _, added in batch)  # None of the batch was stored
+            with self.lock:
+                self.pending -= len(batch)
+                self.written.notify_all()
+            if stop:
+                return
+
+    def check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+        # Wait until everything queued so far is in the store
+        with self.lock:
+            while self.pending:
+                self.written.wait()
+        self.check_error()
+
+    def clear(self):
+        self.flush()
+        self.store.clear()
+        with self.lock:
+            self.next_id = self.store.next_id()
+            self.count = 0
+
+    def __len__(self):
+        # Samples in the store plus those still queued
+        return self.count
+
+    def close(self):
+        # Write what is left and stop the thread; the store stays open
+        self.queue.put(None)
+        self.thread.join()
+        self.check_error()
@@ -0,0 +1,187 @@
+import threading
+import time
+from array import array
+from bisect import bisect_right
+
+# Upper edges, in microseconds, of the buckets of the jitter histogram
+JITTER_BUCKETS_US = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Upper edges, in microseconds, of the buckets of the position age histogram
+AGE_BUCKETS_US = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000)
+
+
+class RingBuffer:
+    # Single-producer / single-consumer buffer of (x, y, t_ns) samples. The sampler
+    # thread only moves `head` and the UI thread only moves `tail`; each slot is
+    # written before `head` is published, so no lock is needed under the GIL.
+
+    def __init__(self, capacity=1 << 14):
+        # Capacity is rounded up to a power of two so indices can be masked
+        size = 1
+        while size < capacity:
+            size <<= 1
+        self.mask = size - 1
+        self.x = array('d', bytes(8 * size))
+        self.y = array('d', bytes(8 * size))
+        self.t = array('q', bytes(8 * size))
+        self.head = 0
+        self.tail = 0
+
+        # Samples the producer had to drop because the consumer fell behind
+        self.dropped = 0
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, x, y, t_ns):
+        head = self.head
+        if head - self.tail > self.mask:
+            self.dropped += 1
+            return False
+        i = head & self.mask
+        self.x[i] = x
+        self.y[i] = y
+        self.t[i] = t_ns
+        self.head = head + 1
+        return True
+
+    def drain(self):
+        # Yield every sample published so far, oldest first
+        tail = self.tail
+        head = self.head
+        mask = self.mask
+        while tail < head:
+            i = tail & mask
+            yield self.x[i], self.y[i], self.t[i]
+            tail += 1
+            self.tail = tail
+
+
+class Histogram:
+    # Distribution of durations in microseconds over fixed buckets
+
+    def __init__(self, buckets_us):
+        self.buckets_us = buckets_us
+        self.counts = [0] * (len(buckets_us) + 1)
+        self.total = 0
+        self.sum_us = 0.0
+        self.max_us = 0.0
+
+    def add(self, value_us):
+        self.counts[bisect_right(self.buckets_us, value_us)] += 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket containing the given fraction of values
+        if not self.total:
+            return 0.0
+        wanted = fraction * self.total
+        seen = 0
+        for edge, count in zip(self.buckets_us, self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(float(edge), self.max_us)
+        return self.max_us
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "mean_us": self.sum_us / self.total if self.total else 0.0,
+            "p99_us": self.percentile(0.99),
+            "max_us": self.max_us,
+            "buckets_us": dict(zip([*map(str, self.buckets_us), "inf"], self.counts)),
+        }
+
+
+class JitterHistogram(Histogram):
+    # Distribution of how far each sample interval strayed from the nominal period
+
+    def __init__(self, period_ns):
+        super().__init__(JITTER_BUCKETS_US)
+        self.period_ns = period_ns
+
+    def record(self, interval_ns):
+        self.add(abs(interval_ns - self.period_ns) / 1000)
+
+
+class PointerSampler:
+    # Samples the latest known pointer position at a fixed rate on its own thread.
+    # The UI feeds positions from <Motion> events with set_position() and drains the
+    # ring buffer once per frame, so the sampling rate does not depend on how busy
+    # the Tk event loop is. It does depend on how fresh the position is: each
+    # position keeps the time of the event it came from, and `age` records how
+    # old it was when sampled, which grows while the event loop is busy.
+
+    def __init__(self, rate_hz=250, capacity=1 << 14):
+        self.rate_hz = rate_hz
+        self.period_ns = int(1e9 / rate_hz)
+        self.buffer = RingBuffer(capacity)
+        self.jitter = JitterHistogram(self.period_ns)
+        self.age = Histogram(AGE_BUCKETS_US)
+
+        # Latest pointer position in canvas coordinates and the perf_counter_ns()
+        # time of its event, None while it is off the canvas
+        self.position = None
+
+        self.thread = None
+        self.running = False
+
+    def set_position(self, x, y, t_ns=None):
+        # t_ns: when the event was handled (default: now)
+        self.position = (x, y, time.perf_counter_ns() if t_ns is None else t_ns)
+
+    def clear_position(self):
+        self.position = None
+
+    def start(self):
+        if self.running:
+            return
+        self.buffer = RingBuffer(self.buffer.mask + 1)
+        self.jitter = JitterHistogram(self.period_ns)
+        self.age = Histogram(AGE_BUCKETS_US)
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="pointer-sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        period = self.period_ns
+        previous = None
+        deadline = time.perf_counter_ns()
+        while self.running:
+            now = time.perf_counter_ns()
+            if now < deadline:
+                time.sleep((deadline - now) / 1e9)
+                now = time.perf_counter_ns()
+
+            position = self.position
+            if position is not None:
+                x, y, event_ns = position
+                self.buffer.push(x, y, now)
+                self.age.add(max(0, now - event_ns) / 1000)
+            if previous is not None:
+                self.jitter.record(now - previous)
+            previous = now
+
+            # Stay on the fixed grid; if we fell more than a period behind, skip the
+            # missed ticks instead of sampling them in a burst
+            deadline += period
+            if now - deadline > period:
+                deadline = now + period
+
+    def drain_into(self, trajectory, start_ns):
+        # Append all pending samples to the trajectory with t in whole ms since
+        # start_ns, like samples recorded from events. Returns how many were added.
+        added = 0
+        for x, y, t_ns in self.buffer.drain():
+            trajectory.append(x, y, (t_ns - start_ns) // 1000000)
+            added += 1
+        return added
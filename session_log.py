@@ -0,0 +1,173 @@
+import queue
+import struct
+import threading
+import zlib
+from array import array
+
+from trajectory import CHUNK_POINTS
+
+# Points a long session keeps in memory and on the canvas by default
+TAIL_POINTS = 20000
+
+# Every chunk is a header (magic, point count, CRC-32 of the data) followed by
+# its x, y and t columns as float64
+MAGIC = b"KSLC"
+CHUNK_HEADER = struct.Struct("<4sII")
+
+
+class SessionLogError(Exception):
+    pass
+
+
+class SessionLog:
+    # Append-only file holding the older part of a long recording. append()
+    # queues a chunk for a background thread, so the Tk thread never waits for
+    # the disk, and chunks() reads them back one at a time, so going through a
+    # session of any length holds a single chunk in memory. Chunks still in the
+    # queue are read from memory instead of waiting for them to be written.
+
+    def __init__(self, path, chunk=CHUNK_POINTS):
+        self.path = path
+        self.chunk = chunk
+        self.file = open(path, "w+b")
+        self.queue = queue.Queue()
+
+        # (offset, count) of every chunk handed over, written or not, and the
+        # columns of those not written yet by chunk number
+        self.index = []
+        self.points = 0
+        self.size = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        # First error raised in the writer thread; reported by the next call
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, name="session-log", daemon=True)
+        self.thread.start()
+
+    def __len__(self):
+        return self.points
+
+    def append(self, x, y, t):
+        # Queue one chunk of columns; they must not change afterwards
+        self.check_error()
+        count = len(x)
+        with self.lock:
+            self.pending[len(self.index)] = (x, y, t)
+        self.index.append((self.size, count))
+        self.points += count
+        self.size += CHUNK_HEADER.size + 24 * count
+        self.queue.put((len(self.index) - 1, (x, y, t)))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                number, columns = item
+                data = b"".join(array('d', column).tobytes() for column in columns)
+                self.file.write(CHUNK_HEADER.pack(MAGIC, len(columns[0]), zlib.crc32(data)) + data)
+                self.file.flush()
+                with self.lock:
+                    self.pending.pop(number, None)
+            except Exception as error:
+                if self.error is None:
+                    self.error = error
+            finally:
+                self.queue.task_done()
+
+    def check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def flush(self):
+        # Wait until everything queued so far is in the file
+        self.queue.join()
+        self.check_error()
+
+    def clear(self):
+        self.flush()
+        self.file.seek(0)
+        self.file.truncate()
+        self.index = []
+        self.points = 0
+        self.size = 0
+        with self.lock:
+            self.pending = {}
+
+    def read_chunk(self, f, offset, count):
+        f.seek(offset)
+        header = f.read(CHUNK_HEADER.size)
+        data = f.read(24 * count)
+        if len(header) < CHUNK_HEADER.size or len(data) < 24 * count:
+            raise SessionLogError(f"{self.path} is truncated")
+        magic, stored, checksum = CHUNK_HEADER.unpack(header)
+        if magic != MAGIC or stored != count or zlib.crc32(data) != checksum:
+            raise SessionLogError(f"{self.path} is damaged at offset {offset}")
+        columns = memoryview(data).cast('d')
+        return columns[:count], columns[count:2 * count], columns[2 * count:]
+
+    def load_chunk(self, f, number):
+        # A chunk's columns from memory while it is queued, else from the file,
+        # where the writer has put it before dropping it from memory
+        with self.lock:
+            columns = self.pending.get(number)
+        if columns is not None:
+            return columns
+        return self.read_chunk(f, *self.index[number])
+
+    def chunks(self):
+        # The logged (x, y, t) columns, one chunk at a time
+        self.check_error()
+        with open(self.path, "rb") as f:
+            for number in range(len(self.index)):
+                yield self.load_chunk(f, number)
+
+    def point(self, index):
+        # A single logged point as a {"x", "y", "t"} dict
+        self.check_error()
+        for number, (_, count) in enumerate(self.index):
+            if index < count:
+                with open(self.path, "rb") as f:
+                    x, y, t = self.load_chunk(f, number)
+                return {"x": x[index], "y": y[index], "t": t[index]}
+            index -= count
+        raise IndexError("session log index out of range")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
+        self.check_error()
+
+
+class Session:
+    # A whole long recording: the chunks in the log followed by the points still
+    # in memory. It can stand in for a Trajectory where one is only read in
+    # pieces (playback, export).
+
+    def __init__(self, log, tail):
+        self.log = log
+        self.tail = tail
+
+    def __len__(self):
+        return len(self.log) + len(self.tail)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("session index out of range")
+        if index < len(self.log):
+            return self.log.point(index)
+        return self.tail[index - len(self.log)]
+
+    def chunks(self, size=CHUNK_POINTS):
+        yield from self.log.chunks()
+        yield from self.tail.chunks(size)
@@ -0,0 +1,335 @@
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from features import pad
+
+# Points each trajectory is resampled to before it is compared
+POINTS = 32
+
+# Sakoe-Chiba window of the DTW distance, as a fraction of POINTS
+DTW_WINDOW = 0.1
+
+# Candidates whose full DTW distance is computed together
+DTW_BATCH = 1024
+
+# Candidates bounded together by LB_Keogh; small enough that the temporaries
+# stay in cache
+LB_BLOCK = 1024
+
+# Most padded values (samples times the longest of them) resampled together
+RESAMPLE_CELLS = 1 << 18
+
+METRICS = ("euclidean", "cosine", "dtw")
+
+
+def resample(columns_list, points=POINTS):
+    # Resample each (x, y, t) trajectory to `points` positions evenly spaced along
+    # its path. Returns a (batch, points, 2) array; all rows are done together.
+    x, y, _, lengths = pad(columns_list)
+    batch = len(lengths)
+    if batch == 0:
+        return np.empty((0, points, 2))
+    width = x.shape[1]
+
+    # Cumulative path length of every row, normalised to [0, 1]; rows that do not
+    # move are spread evenly in index instead
+    step = np.hypot(np.diff(x, axis=1), np.diff(y, axis=1))
+    step = np.where(np.isnan(step), 0.0, step)
+    arc = np.concatenate((np.zeros((batch, 1)), np.cumsum(step, axis=1)), axis=1)
+    total = arc[np.arange(batch), lengths - 1]
+    index = np.arange(width)[None, :] / np.maximum(lengths - 1, 1)[:, None]
+    arc = np.where(total[:, None] > 0, arc / np.where(total > 0, total, 1.0)[:, None], index)
+    valid = np.arange(width)[None, :] < lengths[:, None]
+
+    # Search all rows at once by shifting row r into [2r, 2r + 1]; padding sorts
+    # after the row's real points
+    offsets = 2.0 * np.arange(batch)[:, None]
+    keys = np.where(valid, arc, 1.5) + offsets
+    targets = (np.linspace(0.0, 1.0, points)[None, :] + offsets).ravel()
+    flat = np.searchsorted(keys.ravel(), targets, side="right") - 1
+    row = np.repeat(np.arange(batch), points)
+    col = np.clip(flat - row * width, 0, np.maximum(lengths - 2, 0)[row])
+    nxt = np.minimum(col + 1, lengths[row] - 1)
+
+    start, end = arc[row, col], arc[row, nxt]
+    span = end - start
+    fraction = np.divide(targets - offsets[row, 0] - start, span, out=np.zeros_like(span), where=span > 0)
+    fraction = np.clip(fraction, 0.0, 1.0)
+    out = np.empty((batch * points, 2))
+    out[:, 0] = x[row, col] + fraction * (x[row, nxt] - x[row, col])
+    out[:, 1] = y[row, col] + fraction * (y[row, nxt] - y[row, col])
+    return out.reshape(batch, points, 2)
+
+
+def resample_store(store, ids, points=POINTS):
+    # Resample library samples in chunks of similar length whose padded arrays
+    # stay under RESAMPLE_CELLS values, so one long pass does not pad all the
+    # others to its length. Yields (ids, resampled) per chunk. The columns are
+    # copied under the store's lock, so the library may be cleared meanwhile;
+    # samples it no longer has are skipped.
+    with store.lock:
+        lengths = {sample_id: len(store.columns(sample_id)[0]) for sample_id in ids if sample_id in store}
+    chunk = []
+    for sample_id in sorted(lengths, key=lengths.get):
+        if chunk and (len(chunk) + 1) * lengths[sample_id] > RESAMPLE_CELLS:
+            yield resample_chunk(store, chunk, points)
+            chunk = []
+        chunk.append(sample_id)
+    if chunk:
+        yield resample_chunk(store, chunk, points)
+
+
+def resample_chunk(store, ids, points):
+    with store.lock:
+        ids = [sample_id for sample_id in ids if sample_id in store]
+        columns = [tuple(np.array(column, dtype=np.float64) for column in store.columns(sample_id)) for sample_id in ids]
+    return ids, resample(columns, points)
+
+
+def envelope(query, window):
+    # Running min and max of the query over +-window points (for LB_Keogh)
+    points = len(query)
+    padded = np.pad(query, ((window, window), (0, 0)), mode="edge")
+    stack = np.stack([padded[k:k + points] for k in range(2 * window + 1)])
+    return stack.min(axis=0), stack.max(axis=0)
+
+
+def lb_keogh(candidates, low, high):
+    # Lower bound of the DTW distance from each candidate to the query whose
+    # envelope is (low, high): how far the candidates leave the envelope
+    low, high = low.astype(candidates.dtype), high.astype(candidates.dtype)
+    bounds = np.empty(len(candidates), dtype=candidates.dtype)
+    outside = np.empty((min(LB_BLOCK, len(candidates)),) + candidates.shape[1:], dtype=candidates.dtype)
+    for start in range(0, len(candidates), LB_BLOCK):
+        block = candidates[start:start + LB_BLOCK]
+        part = outside[:len(block)]
+        np.maximum(block, low, out=part)
+        np.minimum(part, high, out=part)
+        np.subtract(block, part, out=part)
+        bounds[start:start + LB_BLOCK] = np.einsum("ijk,ijk->i", part, part)
+    return np.sqrt(bounds)
+
+
+@lru_cache(maxsize=None)
+def band(points, window):
+    # The cells (i, j) of a Sakoe-Chiba band, 1-based, ordered by anti-diagonal
+    # i + j; where each anti-diagonal starts in that order; and for every cell the
+    # rows holding its three predecessors in dtw()'s table, whose row 0 is
+    # infinity and row 1 the (0, 0) corner
+    i, j = np.meshgrid(np.arange(1, points + 1), np.arange(1, points + 1), indexing="ij")
+    inside = np.abs(i - j) <= window
+    i, j = i[inside], j[inside]
+    order = np.lexsort((i, i + j))
+    i, j = i[order], j[order]
+    starts = np.searchsorted(i + j, np.arange(2, 2 * points + 3))
+
+    row = {(0, 0): 1}
+    row.update(((a, b), 2 + k) for k, (a, b) in enumerate(zip(i.tolist(), j.tolist())))
+    previous = np.array([[row.get(cell, 0) for cell in ((a - 1, b - 1), (a - 1, b), (a, b - 1))]
+                         for a, b in zip(i.tolist(), j.tolist())])
+    return i, j, starts, previous
+
+
+def dtw(query, candidates, window):
+    # DTW distances (square root of the summed squared point distances along the
+    # best warping path) from the query to a batch of candidates, within a
+    # Sakoe-Chiba band. Only band cells are stored, one row per cell with the
+    # candidates along it, and the recurrence fills a whole anti-diagonal per step.
+    batch, points, _ = candidates.shape
+    i, j, starts, previous = band(points, window)
+
+    # Squared point distances of the band cells, laid out like the table
+    columns = np.ascontiguousarray(candidates.transpose(1, 2, 0))
+    cost = columns[j - 1, 0]
+    cost -= query[i - 1, 0][:, None]
+    cost *= cost
+    dy = columns[j - 1, 1]
+    dy -= query[i - 1, 1][:, None]
+    dy *= dy
+    cost += dy
+    total = np.empty((2 + len(i), batch))
+    total[0] = np.inf
+    total[1] = 0.0
+    for start, stop in zip(starts[:-1], starts[1:]):
+        before = previous[start:stop]
+        best = np.minimum(np.minimum(total[before[:, 0]], total[before[:, 1]]), total[before[:, 2]])
+        total[2 + start:2 + stop] = cost[start:stop] + best
+    return np.sqrt(total[-1])
+
+
+class SimilarityIndex:
+    # Library samples resampled to fixed-length vectors in one (n, 2 * POINTS)
+    # matrix, for nearest-neighbour queries. Samples are added incrementally like
+    # the feature cache, by sync() or on a background thread with start_sync();
+    # distances are reported per point (RMS), in frame units.
+
+    def __init__(self, points=POINTS):
+        self.points = points
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, 2 * points), dtype=np.float32)
+        self.norms = np.empty(0, dtype=np.float32)
+        self.count = 0
+        self.known = set()
+
+        # Bumped by clear(), so a sync that started before stops adding samples
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+        # First error raised in the sync thread; reported by the next call
+        self.error = None
+
+    def __len__(self):
+        return self.count
+
+    def sync(self, store):
+        # Add the library samples that are not indexed yet; start over if any were
+        # removed. Returns how many were added.
+        ids = store.ids()
+        with self.lock:
+            if not self.known.issubset(ids):
+                self.reset()
+            missing = [sample_id for sample_id in ids if sample_id not in self.known]
+            generation = self.generation
+        added = 0
+        for chunk, resampled in resample_store(store, missing, self.points):
+            if not self.add(chunk, resampled, generation):
+                break
+            added += len(chunk)
+        return added
+
+    def start_sync(self, store):
+        # Run sync() on a background thread unless one is running already; it
+        # keeps going while samples are written to the library meanwhile
+        self.check_error()
+        if self.syncing():
+            return
+        self.thread = threading.Thread(target=self.run, args=(store,), name="similarity-index", daemon=True)
+        self.thread.start()
+
+    def run(self, store):
+        try:
+            while self.sync(store):
+                pass
+        except Exception as error:
+            if self.error is None:
+                self.error = error
+
+    def syncing(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def check_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def add(self, ids, resampled, generation=None):
+        # Add resampled samples unless the index was cleared since `generation`;
+        # ids already indexed are skipped. Returns False if it was cleared.
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return False
+            fresh = [k for k, sample_id in enumerate(ids) if sample_id not in self.known]
+            if not fresh:
+                return True
+            ids = [ids[k] for k in fresh]
+            vectors = resampled[fresh].reshape(len(fresh), -1).astype(np.float32)
+            needed = self.count + len(vectors)
+            if needed > len(self.vectors):
+                # Grow by doubling so adding samples one by one stays cheap
+                capacity = max(needed, 2 * len(self.vectors), 256)
+                for name in ("ids", "vectors", "norms"):
+                    old = getattr(self, name)
+                    new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                    new[:self.count] = old[:self.count]
+                    setattr(self, name, new)
+            self.ids[self.count:needed] = ids
+            self.vectors[self.count:needed] = vectors
+            self.norms[self.count:needed] = np.linalg.norm(vectors, axis=1)
+            self.known.update(ids)
+            self.count = needed
+            return True
+
+    def replace(self, sample_id, columns):
+        # Index a new version of an edited sample, from its columns rounded to
+        # float32 like the library stores them
+        resampled = resample([[np.asarray(column, dtype=np.float32) for column in columns]], self.points)
+        with self.lock:
+            if sample_id in self.known:
+                keep = self.ids[:self.count] != sample_id
+                # New arrays, so queries holding the old ones are not disturbed
+                for name in ("ids", "vectors", "norms"):
+                    old = getattr(self, name)
+                    new = np.zeros_like(old)
+                    new[:self.count - 1] = old[:self.count][keep]
+                    setattr(self, name, new)
+                self.count -= 1
+                self.known.discard(sample_id)
+        self.add([sample_id], resampled)
+
+    def clear(self):
+        with self.lock:
+            self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.known = set()
+        self.generation += 1
+
+    def close(self):
+        # Stop a running sync and wait for it
+        self.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def nearest(self, columns, k=5, metric="euclidean", window=DTW_WINDOW):
+        # The k library samples closest to one trajectory, as (sample_id, distance)
+        # pairs from the closest. Cosine distances are 1 - cosine similarity.
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric {metric!r}")
+        with self.lock:
+            # A sync thread only writes past count or into new arrays
+            count = self.count
+            ids, vectors, norms = self.ids[:count], self.vectors[:count], self.norms[:count]
+        if not count:
+            return []
+        query = resample([columns], self.points)[0]
+        k = min(k, count)
+        if metric == "dtw":
+            return self.nearest_dtw(query, k, max(1, int(round(window * self.points))), ids, vectors)
+
+        q = query.reshape(-1).astype(np.float32)
+        dots = vectors @ q
+        if metric == "cosine":
+            distance = 1.0 - dots / np.maximum(norms * np.linalg.norm(q), 1e-12)
+        else:
+            squared = norms ** 2 + float(q @ q) - 2.0 * dots
+            distance = np.sqrt(np.maximum(squared, 0.0) / self.points)
+        best = np.argpartition(distance, k - 1)[:k]
+        best = best[np.argsort(distance[best])]
+        return [(int(ids[i]), float(distance[i])) for i in best]
+
+    def nearest_dtw(self, query, k, window, ids, vectors):
+        # Rank all samples by LB_Keogh and run the full DTW only until the next
+        # lower bound cannot beat the k-th best distance found so far
+        count = len(ids)
+        candidates = vectors.reshape(count, self.points, 2)
+        low, high = envelope(query, window)
+        bounds = lb_keogh(candidates, low, high)
+        order = np.argsort(bounds)
+        found_ids = np.empty(0, dtype=np.int64)
+        found = np.empty(0)
+        for start in range(0, count, DTW_BATCH):
+            batch = order[start:start + DTW_BATCH]
+            if len(found) >= k and bounds[batch[0]] >= found[k - 1]:
+                break
+            distances = dtw(query, candidates[batch].astype(np.float64), window)
+            found_ids = np.concatenate((found_ids, batch))
+            found = np.concatenate((found, distances))
+            keep = np.argsort(found)[:k]
+            found_ids, found = found_ids[keep], found[keep]
+        scale = np.sqrt(self.points)
+        return [(int(ids[i]), float(d / scale)) for i, d in zip(found_ids, found)]
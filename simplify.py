@@ -0,0 +1,103 @@
+import math
+
+# How far (px) a dropped point may lie from the straight segment replacing it
+TOLERANCE = 1.0
+
+# How far (px) a dropped point may be from where constant speed along that
+# segment would put it at its timestamp, so pauses and speed changes survive
+TIME_TOLERANCE = 2.0
+
+
+def wrap(angle):
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class StreamingSimplifier:
+    # Online path simplification between the event handler and a Trajectory.
+    # Each incoming point narrows two "sleeves" anchored at the last kept point:
+    # a cone of directions (the dropped points stay within `tolerance` of the
+    # segment) and a range of speeds (they stay within `time_tolerance` of
+    # constant-speed motion along it). A point outside either sleeve makes the
+    # previous point the next anchor. Every decision is O(1), and kept points keep
+    # their original timestamps.
+    #
+    # The newest point is held back until the next one shows whether it is needed,
+    # so the target trajectory trails the pointer by one point until flush().
+
+    def __init__(self, tolerance=TOLERANCE, time_tolerance=TIME_TOLERANCE):
+        self.tolerance = tolerance
+        self.time_tolerance = time_tolerance
+        self.target = None
+        self.reset(None)
+
+    def reset(self, target):
+        # Start simplifying into a new trajectory
+        self.target = target
+        self.anchor = None
+        self.pending = None
+        self.received = 0
+        self.kept = 0
+        self.open_sleeves()
+
+    def open_sleeves(self):
+        self.base = None
+        self.low = -math.pi
+        self.high = math.pi
+        self.slowest = 0.0
+        self.fastest = math.inf
+
+    def append(self, x, y, t):
+        # Same signature as Trajectory.append, so it can stand in for one
+        self.received += 1
+        if self.anchor is None:
+            self.keep(x, y, t)
+            self.anchor = (x, y, t)
+            return
+        if self.pending is not None and not self.fits(x, y, t):
+            # The held-back point is needed: it becomes the new anchor
+            self.keep(*self.pending)
+            self.anchor = self.pending
+            self.open_sleeves()
+            self.fits(x, y, t)
+        self.pending = (x, y, t)
+
+    def fits(self, x, y, t):
+        # Check the point against both sleeves and narrow them to it
+        ax, ay, at = self.anchor
+        dx, dy, dt = x - ax, y - ay, t - at
+        distance = math.hypot(dx, dy)
+
+        if distance > self.tolerance:
+            direction = math.atan2(dy, dx)
+            if self.base is None:
+                self.base = direction
+            offset = wrap(direction - self.base)
+            if not self.low <= offset <= self.high:
+                return False
+            half = math.asin(self.tolerance / distance)
+            self.low = max(self.low, offset - half)
+            self.high = min(self.high, offset + half)
+
+        if dt > 0:
+            speed = distance / dt
+            if not self.slowest <= speed <= self.fastest:
+                return False
+            self.slowest = max(self.slowest, (distance - self.time_tolerance) / dt)
+            self.fastest = min(self.fastest, (distance + self.time_tolerance) / dt)
+        return True
+
+    def keep(self, x, y, t):
+        self.target.append(x, y, t)
+        self.kept += 1
+
+    def flush(self):
+        # Keep the held-back point, e.g. the end of a recording
+        if self.pending is not None:
+            self.keep(*self.pending)
+            self.anchor = self.pending
+            self.pending = None
+            self.open_sleeves()
+
+    def ratio(self):
+        # Fraction of the received points that were kept
+        return self.kept / self.received if self.received else 1.0
@@ -0,0 +1,126 @@
+import math
+
+from trajectory import Trajectory
+
+# Side of a grid cell in canvas pixels
+CELL = 16
+
+
+class GridIndex:
+    # Uniform grid of buckets over the points of a Trajectory, for hit-testing,
+    # nearest-point and box queries on the canvas. Points are added as the
+    # trajectory grows and moved in place when they are dragged, so the index
+    # never has to be rebuilt while recording or editing.
+
+    def __init__(self, cell=CELL):
+        self.cell = cell
+        self.buckets = {}
+        self.trajectory = Trajectory()
+
+        # Smallest and largest occupied cell columns and rows; never shrunk, which
+        # only makes searches look at a few extra empty cells
+        self.bounds = None
+
+        # Number of points of the trajectory that are in the buckets
+        self.indexed = 0
+
+    def key(self, x, y):
+        return (math.floor(x / self.cell), math.floor(y / self.cell))
+
+    def sync(self, trajectory):
+        # Bring the index up to date with the trajectory; only new points are added
+        if trajectory is not self.trajectory or len(trajectory) < self.indexed:
+            self.buckets = {}
+            self.bounds = None
+            self.trajectory = trajectory
+            self.indexed = 0
+        xs, ys, _ = trajectory.columns(self.indexed)
+        for i, (x, y) in enumerate(zip(xs, ys), self.indexed):
+            self.add(self.key(x, y), i)
+        self.indexed = len(trajectory)
+
+    def add(self, key, i):
+        self.buckets.setdefault(key, []).append(i)
+        if self.bounds is None:
+            self.bounds = [key[0], key[0], key[1], key[1]]
+        else:
+            bounds = self.bounds
+            bounds[0] = min(bounds[0], key[0])
+            bounds[1] = max(bounds[1], key[0])
+            bounds[2] = min(bounds[2], key[1])
+            bounds[3] = max(bounds[3], key[1])
+
+    def move(self, i, x, y):
+        # Move point i of the trajectory to (x, y), keeping the index in step
+        trajectory = self.trajectory
+        old = self.key(trajectory.x[i], trajectory.y[i])
+        new = self.key(x, y)
+        if old != new:
+            bucket = self.buckets[old]
+            bucket.remove(i)
+            if not bucket:
+                del self.buckets[old]
+            self.add(new, i)
+        trajectory.move_point(i, x, y)
+
+    def nearest(self, x, y, max_distance=math.inf):
+        # Index of the point closest to (x, y) within max_distance, or None.
+        # Searches rings of cells outwards and stops once no closer point can exist.
+        if not self.buckets:
+            return None
+        xs, ys = self.trajectory.x, self.trajectory.y
+        cx, cy = self.key(x, y)
+        best, best_distance = None, max_distance
+        ring = 0
+        max_ring = math.inf if max_distance == math.inf else int(max_distance // self.cell) + 1
+        while ring <= max_ring:
+            for key in self.ring_keys(cx, cy, ring):
+                for i in self.buckets.get(key, ()):
+                    distance = math.hypot(xs[i] - x, ys[i] - y)
+                    if distance <= best_distance:
+                        best, best_distance = i, distance
+            # Every point in a later ring is at least `ring * cell` away
+            if best is not None and ring * self.cell >= best_distance:
+                break
+            if self.encloses_all(cx, cy, ring):
+                break
+            ring += 1
+        return best
+
+    def ring_keys(self, cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dx in range(-ring, ring + 1):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+        for dy in range(-ring + 1, ring):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+
+    def encloses_all(self, cx, cy, ring):
+        # True once the square of rings up to `ring` covers every occupied cell
+        x0, x1, y0, y1 = self.bounds
+        return cx - ring <= x0 and cx + ring >= x1 and cy - ring <= y0 and cy + ring >= y1
+
+    def in_box(self, x1, y1, x2, y2):
+        # Indices of all points inside the rectangle, in trajectory order
+        x1, x2 = min(x1, x2), max(x1, x2)
+        y1, y2 = min(y1, y2), max(y1, y2)
+        xs, ys = self.trajectory.x, self.trajectory.y
+        if self.bounds is None:
+            return []
+        (cx1, cy1), (cx2, cy2) = self.key(x1, y1), self.key(x2, y2)
+
+        # Only visit cells that can hold points
+        bx0, bx1, by0, by1 = self.bounds
+        cx1, cx2 = max(cx1, bx0), min(cx2, bx1)
+        cy1, cy2 = max(cy1, by0), min(cy2, by1)
+        found = []
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                for i in self.buckets.get((cx, cy), ()):
+                    if x1 <= xs[i] <= x2 and y1 <= ys[i] <= y2:
+                        found.append(i)
+        found.sort()
+        return found
@@ -0,0 +1,77 @@
+import numpy as np
+
+from trajectory import Trajectory
+
+# Points per generated path
+POINTS = 64
+
+# Defaults used when no trained model is given
+DEFAULT_SPEED = 1.1  # px per ms along the straight A->B line
+DEFAULT_REACTION_MS = 150.0
+DEFAULT_EFFICIENCY = 0.95
+
+# Relative spread of durations and curve amplitudes between generated paths
+DURATION_SPREAD = 0.15
+AMPLITUDE_SPREAD = 0.5
+
+# Standard deviation of the per-point positional noise, in px
+NOISE_PX = 0.6
+
+
+def parameters(model):
+    # Speed and straightness to generate with, taken from a trained model's
+    # feature means when there is one
+    if model is None:
+        return DEFAULT_SPEED, DEFAULT_REACTION_MS, DEFAULT_EFFICIENCY
+    names = list(model["features"])
+    mean = model["mean"]
+    duration = mean[names.index("duration")]
+    straight = mean[names.index("straight_distance")]
+    efficiency = float(np.clip(mean[names.index("efficiency")], 0.5, 1.0))
+    speed = straight / duration if duration > 0 and straight > 0 else DEFAULT_SPEED
+    return speed, 0.0, efficiency
+
+
+def generate(start, end, count=1, model=None, points=POINTS, seed=None):
+    # Generate `count` paths from start to end at once. Returns x, y and t arrays
+    # of shape (count, points), with t in ms from the first point.
+    rng = np.random.default_rng(seed)
+    speed, reaction, efficiency = parameters(model)
+    (ax, ay), (bx, by) = start, end
+    dx, dy = bx - ax, by - ay
+    distance = float(np.hypot(dx, dy))
+
+    # Minimum-jerk progress along the A->B line over normalised time
+    tau = np.linspace(0.0, 1.0, points)
+    progress = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+
+    # Sideways bow whose size matches the wanted path efficiency: a half sine of
+    # amplitude a over a line of length D is about D * (1 + (pi * a / D)^2 / 4) long
+    amplitude = distance / np.pi * 2 * np.sqrt(max(1 / efficiency - 1, 0.0))
+    amplitudes = amplitude * (1 + AMPLITUDE_SPREAD * rng.standard_normal(count))
+    skew = rng.uniform(-0.3, 0.3, count)
+    bow = np.sin(np.pi * progress)[None, :] + skew[:, None] * np.sin(2 * np.pi * progress)[None, :]
+    offset = amplitudes[:, None] * bow
+
+    along = progress[None, :] * distance
+    noise = rng.normal(0.0, NOISE_PX, (2, count, points))
+    noise[:, :, 0] = 0.0
+    noise[:, :, -1] = 0.0
+
+    # Rotate from path coordinates (along, sideways) into canvas coordinates
+    if distance > 0:
+        ux, uy = dx / distance, dy / distance
+    else:
+        ux, uy = 1.0, 0.0
+    x = ax + along * ux - offset * uy + noise[0]
+    y = ay + along * uy + offset * ux + noise[1]
+
+    durations = (reaction + distance / speed) * rng.lognormal(0.0, DURATION_SPREAD, count)
+    t = durations[:, None] * tau[None, :]
+    return x, y, t
+
+
+def generate_trajectory(start, end, model=None, points=POINTS, seed=None):
+    # A single generated path as a Trajectory
+    x, y, t = generate(start, end, 1, model, points, seed)
+    return Trajectory.from_columns(x[0], y[0], t[0])
@@ -0,0 +1,225 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from augmentation import Prefetcher, augmented_batches
+from features import FEATURE_NAMES, extract
+from sample_store import SampleStore
+
+# Number of cross-validation folds
+FOLDS = 5
+
+# Fewest samples handed to one feature-extraction task
+MIN_CHUNK = 16
+
+# Lower bound on feature standard deviations, so constant features do not blow up scores
+MIN_STD = 1e-6
+
+
+def fit(matrix):
+    # The model: per-feature mean and standard deviation of the training samples
+    return {
+        "features": FEATURE_NAMES,
+        "mean": matrix.mean(axis=0),
+        "std": matrix.std(axis=0),
+        "samples": len(matrix),
+    }
+
+
+def log_likelihood(model, matrix):
+    # Mean log-likelihood of the rows under the model's diagonal Gaussian
+    std = np.maximum(model["std"], MIN_STD)
+    z = (matrix - model["mean"]) / std
+    return float(np.mean(-0.5 * (z ** 2).sum(axis=1) - np.log(std).sum() - 0.5 * len(std) * np.log(2 * np.pi)))
+
+
+def extract_chunk(path, ids):
+    # Worker: features for some samples, read straight from the memory-mapped library
+    store = SampleStore(path, readonly=True)
+    try:
+        return ids, extract([store.columns(sample_id) for sample_id in ids])
+    finally:
+        store.close()
+
+
+def pool_context():
+    # Workers come from a fork server where there is one: forking the app itself
+    # would copy a process that runs sampler, writer and prefetch threads
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context()
+
+
+def score_fold(name, shape, fold, folds):
+    # Worker: fit on every fold but one and score the held-out fold. The feature
+    # matrix is read from shared memory instead of being pickled into each task.
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+        held_out = np.arange(shape[0]) % folds == fold
+        score = log_likelihood(fit(matrix[~held_out]), matrix[held_out])
+        del matrix
+        return score
+    finally:
+        memory.close()
+
+
+class TrainingJob:
+    # Feature extraction and cross-validation on a process pool. The UI calls
+    # poll() from an `after` timer; it never blocks and reports progress until the
+    # job is done or cancelled.
+    #
+    # With augment > 0 that many augmented copies of every sample are made and
+    # their features extracted on a prefetching thread while the pool works. They
+    # are added to the final fit; cross-validation only scores real samples.
+
+    def __init__(self, store, cache, workers=None, folds=FOLDS, augment=0, seed=None):
+        self.path = store.path
+        self.ids = store.ids()
+        self.cache = cache
+        self.workers = workers or os.cpu_count() or 1
+        self.folds = min(folds, len(self.ids))
+        self.augment = augment
+        self.seed = seed
+
+        # Feature rows of augmented samples, from a Prefetcher over a read-only store
+        self.augmented = None
+        self.augment_store = None
+        self.extra = []
+        self.extra_count = 0
+
+        self.executor = None
+        self.pending = []
+        self.memory = None
+        self.stage = "idle"
+        self.done = 0
+        self.total = 0
+        self.scores = []
+
+        self.model = None
+        self.error = None
+
+    def start(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context())
+        missing = [sample_id for sample_id in self.ids if sample_id not in self.cache.rows]
+        size = max(MIN_CHUNK, -(-len(missing) // (4 * self.workers)))
+        self.pending = [self.executor.submit(extract_chunk, self.path, missing[i:i + size])
+                        for i in range(0, len(missing), size)]
+        self.stage = "features"
+        self.done = 0
+        self.total = len(self.pending)
+
+        if self.augment:
+            self.augment_store = SampleStore(self.path, readonly=True)
+            batches = augmented_batches(self.augment_store, self.ids, self.augment, seed=self.seed)
+            self.augmented = Prefetcher(map(extract, batches))
+
+    def poll(self):
+        # Collect finished tasks and move to the next stage; returns True once the
+        # job has finished (successfully or not)
+        if self.stage in ("finished", "cancelled"):
+            return True
+
+        if self.augmented is not None:
+            try:
+                for rows in self.augmented.ready():
+                    self.extra.append(rows)
+                    self.extra_count += len(rows)
+            except Exception as error:
+                self.error = error
+                self.cancel()
+                return True
+
+        still_pending = []
+        for future in self.pending:
+            if not future.done():
+                still_pending.append(future)
+                continue
+            try:
+                result = future.result()
+            except Exception as error:
+                self.error = error
+                self.cancel()
+                return True
+            self.collect(result)
+            self.done += 1
+        self.pending = still_pending
+
+        if not self.pending:
+            if self.stage == "features":
+                self.start_cross_validation()
+            elif self.stage == "cross_validation" and (self.augmented is None or self.augmented.finished):
+                self.finish()
+        return self.stage == "finished"
+
+    def collect(self, result):
+        if self.stage == "features":
+            ids, rows = result
+            self.cache.rows.update(zip(ids, rows))
+        else:
+            self.scores.append(result)
+
+    def start_cross_validation(self):
+        matrix = self.matrix()
+        self.stage = "cross_validation"
+        self.done = 0
+        self.total = 0
+        if self.folds < 2:
+            return
+
+        # Publish the feature matrix once in shared memory for all folds
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+        shared = np.ndarray(matrix.shape, dtype=np.float64, buffer=self.memory.buf)
+        shared[:] = matrix
+        del shared
+        self.pending = [self.executor.submit(score_fold, self.memory.name, matrix.shape, fold, self.folds)
+                        for fold in range(self.folds)]
+        self.total = len(self.pending)
+
+    def matrix(self):
+        if not self.ids:
+            return np.empty((0, len(FEATURE_NAMES)))
+        return np.vstack([self.cache.rows[sample_id] for sample_id in self.ids])
+
+    def finish(self):
+        self.model = fit(np.vstack([self.matrix()] + self.extra))
+        self.model["cv_log_likelihood"] = float(np.mean(self.scores)) if self.scores else None
+        self.model["augmented"] = self.extra_count
+        self.stage = "finished"
+        self.shutdown()
+
+    def cancel(self):
+        for future in self.pending:
+            future.cancel()
+        self.pending = []
+        self.stage = "cancelled"
+        self.shutdown()
+
+    def shutdown(self):
+        # The prefetch thread is joined before the store it reads is closed
+        if self.augmented is not None:
+            self.augmented.close()
+            self.augmented = None
+        if self.augment_store is not None:
+            self.augment_store.close()
+            self.augment_store = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def progress(self):
+        # Human-readable progress for the status label
+        if self.stage == "features":
+            return f"Extracting features... {self.done}/{self.total}"
+        if self.stage == "cross_validation":
+            if not self.pending and self.augmented is not None:
+                return f"Augmenting... {self.extra_count} samples"
+            return f"Cross-validating... {self.done}/{self.total}"
+        return self.stage.capitalize()
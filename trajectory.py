@@ -0,0 +1,151 @@
+import sys
+from array import array
+
+# Capacity of a freshly created trajectory, in points
+INITIAL_CAPACITY = 256
+
+# Points per piece when a trajectory is read in pieces
+CHUNK_POINTS = 4096
+
+
+def empty_column(capacity):
+    return array('d', bytes(8 * capacity))
+
+
+class Trajectory:
+    # Recorded samples stored as three parallel float64 columns (x, y, t in ms)
+    # instead of one dict per point. The columns are over-allocated and doubled
+    # when full, so appends are amortized O(1) and growing never resizes an array
+    # that a slice may still be viewing.
+
+    def __init__(self, x=None, y=None, t=None):
+        # Points dropped from the front (e.g. spilled to disk in a long session);
+        # index 0 is point `offset` of the whole recording
+        self.offset = 0
+
+        if x is None:
+            self.count = 0
+            self.x = empty_column(INITIAL_CAPACITY)
+            self.y = empty_column(INITIAL_CAPACITY)
+            self.t = empty_column(INITIAL_CAPACITY)
+        else:
+            # Wrap existing columns (arrays or memoryviews) without copying
+            self.count = len(x)
+            self.x = x
+            self.y = y
+            self.t = t
+
+    @classmethod
+    def from_points(cls, points):
+        # Build a trajectory from an iterable of {"x", "y", "t"} dicts
+        trajectory = cls()
+        for point in points:
+            trajectory.append(point["x"], point["y"], point["t"])
+        return trajectory
+
+    @classmethod
+    def from_columns(cls, x, y, t):
+        # Build a trajectory holding a copy of any float sequences (e.g. NumPy arrays)
+        return cls(array('d', x), array('d', y), array('d', t))
+
+    def __len__(self):
+        return self.count
+
+    def __bool__(self):
+        return self.count > 0
+
+    def append(self, x, y, t):
+        if self.count == len(self.x):
+            self.grow(max(INITIAL_CAPACITY, 2 * self.count))
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.t[i] = t
+        self.count = i + 1
+
+    def grow(self, capacity):
+        count = self.count
+        columns = []
+        for old in (self.x, self.y, self.t):
+            new = empty_column(capacity)
+            with memoryview(new) as view, memoryview(old) as source:
+                view[:count] = source[:count]
+            columns.append(new)
+        self.x, self.y, self.t = columns
+
+    def move_point(self, index, x, y):
+        # Change the position of a recorded point in place, keeping its time
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("trajectory index out of range")
+        self.x[index] = x
+        self.y[index] = y
+
+    def drop_front(self, count):
+        # Forget the first `count` points. The rest move to new columns, so slices
+        # of the old ones stay valid.
+        count = min(count, self.count)
+        rest = self.count - count
+        columns = []
+        for old in (self.x, self.y, self.t):
+            new = empty_column(max(INITIAL_CAPACITY, len(old)))
+            with memoryview(new) as view, memoryview(old) as source:
+                view[:rest] = source[count:self.count]
+            columns.append(new)
+        self.x, self.y, self.t = columns
+        self.count = rest
+        self.offset += count
+
+    def clear(self):
+        self.count = 0
+
+    def columns(self, start=0, stop=None):
+        # Zero-copy memoryviews of the x, y and t columns for the given range
+        start, stop, _ = slice(start, stop).indices(self.count)
+        stop = max(start, stop)
+        return (memoryview(self.x)[start:stop],
+                memoryview(self.y)[start:stop],
+                memoryview(self.t)[start:stop])
+
+    def chunks(self, size=CHUNK_POINTS):
+        # The columns in pieces of at most `size` points, for code that streams
+        for start in range(0, self.count, size):
+            yield self.columns(start, start + size)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            if index.step not in (None, 1):
+                raise ValueError("Trajectory slices do not support a step")
+            return Trajectory(*self.columns(index.start or 0, index.stop))
+
+        # Single points are returned as dicts for code that still expects them
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("trajectory index out of range")
+        return {"x": self.x[index], "y": self.y[index], "t": self.t[index]}
+
+    def __iter__(self):
+        for x, y, t in zip(*self.columns()):
+            yield {"x": x, "y": y, "t": t}
+
+    def record(self):
+        # The trajectory in the same "A" / "B" / "points" layout as the recorded text
+        if not self.count:
+            return {}
+        first, last = self[0], self[-1]
+        return {
+            "A": {"x": first["x"], "y": first["y"], "t": 0},
+            "B": last,
+            "points": list(self[1:-1]),
+        }
+
+    def memory_usage(self):
+        # Bytes held by this trajectory, including unused capacity
+        total = sys.getsizeof(self)
+        # Arrays report their buffer as part of their size; memoryviews from a
+        # slice only count the view object, as the buffer belongs to the parent
+        for column in (self.x, self.y, self.t):
+            total += sys.getsizeof(column)
+        return total